@@ -0,0 +1,151 @@
+# admission.py - admission control for deck builds (global and per-user caps, bounded wait queue)
+
+# imports
+import asyncio
+import math
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+
+# deck builds running at the same time (each holds a worker and hits a dictionary site)
+DECK_BUILDS_MAX_ACTIVE = 4
+# deck builds of one user running at the same time
+DECK_BUILDS_MAX_PER_USER = 1
+# deck builds waiting for a slot, in total and per user
+DECK_BUILDS_MAX_QUEUED = 32
+DECK_BUILDS_MAX_QUEUED_PER_USER = 20
+# seconds an interactive (form) request waits for a slot before it is turned away
+DECK_BUILD_MAX_WAIT = 20
+# assumed duration (seconds) of a deck build until real ones have been measured
+DECK_BUILD_INITIAL_ESTIMATE = 60
+
+class AdmissionRejected(Exception):
+    """ a request was not admitted: status is 429 (the user's own limit) or 503 (server busy),
+    retry_after the number of seconds after which a retry has a chance"""
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class AdmissionGate:
+    """
+    Lets at most max_active builds (max_per_user per user) run at once. Callers beyond that
+    queue up (at most max_queued, max_queued_per_user per user) and wait for a slot, anything
+    more is rejected right away with a Retry-After estimated from recent build durations.
+    The limits hold per process, run several processes with correspondingly smaller limits.
+    """
+
+    def __init__(self, max_active=DECK_BUILDS_MAX_ACTIVE, max_per_user=DECK_BUILDS_MAX_PER_USER,
+                 max_queued=DECK_BUILDS_MAX_QUEUED, max_queued_per_user=DECK_BUILDS_MAX_QUEUED_PER_USER):
+        self.max_active = max_active
+        self.max_per_user = max_per_user
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self.cond = threading.Condition()
+        self.active = Counter()   # user -> running builds
+        self.queued = Counter()   # user -> waiting builds
+        self.waiters = []         # (loop, future) of coroutines waiting in run_async
+        self.avg_duration = DECK_BUILD_INITIAL_ESTIMATE
+
+    def retry_after(self, ahead=None):
+        """ seconds until a slot is likely to free up with `ahead` builds queued before the caller"""
+        if ahead is None:
+            ahead = sum(self.queued.values())
+        return max(1, math.ceil(self.avg_duration * (ahead + 1) / self.max_active))
+
+    def enqueue(self, user_id):
+        """ reserve a place in the queue for one build of user_id (raises AdmissionRejected)"""
+        with self.cond:
+            if self.queued[user_id] >= self.max_queued_per_user:
+                raise AdmissionRejected("too many of your deck builds are waiting", 429,
+                                        self.retry_after(self.queued[user_id]))
+            if sum(self.queued.values()) >= self.max_queued:
+                raise AdmissionRejected("the server is busy building decks", 503, self.retry_after())
+            self.queued[user_id] += 1
+
+    def cancel(self, user_id):
+        """ give back a place reserved with enqueue that will not be run"""
+        with self.cond:
+            self.queued[user_id] -= 1
+            if self.queued[user_id] <= 0:
+                del self.queued[user_id]
+
+    def _can_start(self, user_id):
+        return sum(self.active.values()) < self.max_active and self.active[user_id] < self.max_per_user
+
+    def _dequeue(self, user_id):
+        self.queued[user_id] -= 1
+        if self.queued[user_id] <= 0:
+            del self.queued[user_id]
+
+    def _release(self, user_id, started):
+        with self.cond:
+            self.active[user_id] -= 1
+            if self.active[user_id] <= 0:
+                del self.active[user_id]
+            # moving average of build durations, used for Retry-After
+            self.avg_duration = 0.8 * self.avg_duration + 0.2 * (time.monotonic() - started)
+            self.cond.notify_all()
+            waiters, self.waiters = self.waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+    @contextmanager
+    def run(self, user_id, timeout=None):
+        """ wait (at most timeout seconds) for a slot for a build enqueued for user_id and hold it"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            try:
+                while not self._can_start(user_id):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        status = 429 if self.active[user_id] >= self.max_per_user else 503
+                        raise AdmissionRejected("no deck build slot became free in time", status, self.retry_after())
+                    self.cond.wait(remaining)
+            finally:
+                self._dequeue(user_id)
+            self.active[user_id] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(user_id, started)
+
+    @asynccontextmanager
+    async def run_async(self, user_id):
+        """ run for coroutines (see asgi.py): waits for the slot in the event loop instead of
+        blocking a thread"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                with self.cond:
+                    if self._can_start(user_id):
+                        self.active[user_id] += 1
+                        break
+                    waiter = loop.create_future()
+                    self.waiters.append((loop, waiter))
+                await waiter
+        finally:
+            with self.cond:
+                self._dequeue(user_id)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(user_id, started)
+
+    @contextmanager
+    def admit(self, user_id, timeout=DECK_BUILD_MAX_WAIT):
+        """ enqueue and run in one go (for builds done within a request)"""
+        self.enqueue(user_id)
+        with self.run(user_id, timeout=timeout):
+            yield
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+# shared by the create form and the JSON API
+deck_build_gate = AdmissionGate()
@@ -0,0 +1,202 @@
+# api.py - versioned JSON API (token auth) for headless uploads and deck builds
+
+# imports
+from functools import wraps
+from flask import Blueprint, current_app, g, jsonify, request, url_for
+from werkzeug.exceptions import HTTPException
+from db_helpers import (load_vocabdb, ingest_vocabdb, open_vocabdb, list_vocabdb_books, get_token_user,
+                        insert_deck_job, get_deck_job, get_deck_jobs, get_deck_by_id)
+from helpers import (save_vocabdb, get_vocabdb_path, vocabdb_exists, submit_deck_job,
+                     send_deck_file, get_book_covers, bearer_token)
+from k2a_dictionaries import get_dictionaries
+from admission import deck_build_gate, AdmissionRejected
+
+# most decks one (batch) request may submit
+DECK_BATCH_LIMIT = 20
+
+# fields of a job shown to clients
+JOB_FIELDS = ("id", "status", "message", "book_id", "dict_id", "card_type", "deck_id", "cards", "created_at", "updated_at")
+
+def make_api_blueprint(db, db_name, logger):
+    """
+    Blueprint of the JSON API under /api/v1. Clients authenticate with
+    "Authorization: Bearer <token>" (see flask create-api-token); nothing is kept in the
+    session and no flash messages are produced, errors come back as {"error": "..."}.
+    """
+    api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+    def token_required(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            token = bearer_token()
+            user_id = get_token_user(db, token) if token else None
+            if user_id is None:
+                return jsonify(error="missing or invalid API token"), 401, {"WWW-Authenticate": "Bearer"}
+            g.user_id = user_id
+            return f(*args, **kwargs)
+        return decorated_function
+
+    @api.errorhandler(HTTPException)
+    def json_error(e):
+        response = e.get_response()
+        response.data = current_app.json.dumps({"error": e.description})
+        response.content_type = "application/json"
+        return response
+
+    def job_json(job):
+        result = {field: job[field] for field in JOB_FIELDS}
+        result["status_url"] = url_for("api.deck_job", job_id=job["id"])
+        if job["status"] == "done" and job["deck_id"]:
+            result["download_url"] = url_for("api.download_deck", deck_id=job["deck_id"])
+        return result
+
+    def validate_deck_request(vdb, spec):
+        """ (book_id, dict_id, card_type) of a deck request, or raise ValueError"""
+        if not isinstance(spec, dict):
+            raise ValueError("a deck request must be an object")
+        book_id = str(spec.get("book_id") or "")
+        card_type = str(spec.get("card_type") or "").upper()
+        try:
+            dict_id = int(spec.get("dict_id"))
+        except (TypeError, ValueError):
+            raise ValueError("dict_id must be an integer")
+        if card_type not in ("A", "B"):
+            raise ValueError("card_type must be 'A' or 'B'")
+        rows = vdb.execute("SELECT lang FROM BOOK_INFO WHERE id = ?", book_id) if book_id else []
+        if not rows:
+            raise ValueError(f"book {book_id!r} not found in vocab db")
+        if not any(d['id'] == dict_id for d in get_dictionaries(rows[0]['lang'])):
+            raise ValueError(f"dictionary {dict_id} is not available for language {rows[0]['lang']}")
+        return book_id, dict_id, card_type
+
+    def user_vocabdb():
+        if not vocabdb_exists(g.user_id):
+            return None
+        return open_vocabdb(get_vocabdb_path(g.user_id))
+
+    @api.post("/upload")
+    @token_required
+    def upload():
+        """ upload a vocab.db (multipart field vocab_db or the raw request body)"""
+        file = request.files.get("vocab_db")
+        data = file.read() if file else request.get_data()
+        if not data.startswith(b"SQLite format 3\x00"):
+            return jsonify(error="not a SQLite database"), 400
+        conn, summary, errors = load_vocabdb(data, logger)
+        if conn is None:
+            return jsonify(error="invalid vocab.db", details=errors), 422
+        # same as the upload form: the saved copy is what counts, the central lookup
+        # tables can be rebuilt from it
+        try:
+            save_vocabdb(conn, g.user_id, logger)
+        except Exception as e:
+            logger.exception(f"api upload: failed to save vocab.db of user {g.user_id}: {e}")
+            conn.close()
+            return jsonify(error="vocab.db could not be saved"), 500
+        try:
+            ingest_vocabdb(conn, db_name, g.user_id, logger)
+        except Exception as e:
+            logger.error(f"api upload: failed to ingest vocab.db of user {g.user_id}: {e}")
+        finally:
+            conn.close()
+        return jsonify(
+            num_books=summary["num_books"], num_words=summary["num_words"], num_lookups=summary["num_lookups"]
+        ), 201
+
+    @api.get("/books")
+    @token_required
+    def books():
+        """ books of the uploaded vocab.db (?lang= filters by language)"""
+        vdb = user_vocabdb()
+        if vdb is None:
+            return jsonify(error="no vocab.db uploaded"), 409
+        result = list_vocabdb_books(db, vdb, g.user_id, request.args.get("lang"))
+        # start fetching missing covers in the background (like the create page), the
+        # cover urls accept the API token
+        get_book_covers(result, logger, deadline=0)
+        for book in result:
+            book["cover_url"] = url_for("book_cover", asin=book["asin"])
+        return jsonify(books=result)
+
+    @api.get("/dictionaries")
+    @token_required
+    def dictionaries():
+        """ dictionaries available for a language (?lang=, required)"""
+        lang = request.args.get("lang", "")
+        if not lang:
+            return jsonify(error="lang is required"), 400
+        try:
+            return jsonify(dictionaries=get_dictionaries(lang))
+        except ValueError:
+            return jsonify(error=f"no dictionaries for language {lang!r}"), 404
+
+    @api.post("/decks")
+    @token_required
+    def submit_decks():
+        """ queue one deck build ({"book_id", "dict_id", "card_type"}) or several ({"decks": [...]}),
+        answered with 202 and the jobs to poll"""
+        payload = request.get_json(silent=True)
+        if payload is None:
+            return jsonify(error="expected a JSON body"), 400
+        batch = isinstance(payload, dict) and "decks" in payload
+        specs = payload["decks"] if batch else [payload]
+        if not isinstance(specs, list) or not specs:
+            return jsonify(error="decks must be a non-empty list"), 400
+        if len(specs) > DECK_BATCH_LIMIT:
+            return jsonify(error=f"at most {DECK_BATCH_LIMIT} decks per request"), 400
+        vdb = user_vocabdb()
+        if vdb is None:
+            return jsonify(error="no vocab.db uploaded"), 409
+
+        # validate the whole batch before queueing any of it
+        deck_requests = []
+        for index, spec in enumerate(specs):
+            try:
+                deck_requests.append(validate_deck_request(vdb, spec))
+            except ValueError as e:
+                return jsonify(error=str(e), index=index), 422
+
+        # admit the whole batch or none of it
+        admitted = 0
+        try:
+            for _ in deck_requests:
+                deck_build_gate.enqueue(g.user_id)
+                admitted += 1
+        except AdmissionRejected as e:
+            for _ in range(admitted):
+                deck_build_gate.cancel(g.user_id)
+            return jsonify(error=str(e), retry_after=e.retry_after), e.status, {"Retry-After": str(e.retry_after)}
+
+        app = current_app._get_current_object()
+        jobs = []
+        for book_id, dict_id, card_type in deck_requests:
+            job_id = insert_deck_job(db, g.user_id, book_id, dict_id, card_type)
+            submit_deck_job(app, db, job_id, g.user_id, book_id, dict_id, card_type, logger)
+            jobs.append(job_json(get_deck_job(db, g.user_id, job_id)))
+        if batch:
+            return jsonify(jobs=jobs), 202
+        return jsonify(jobs[0]), 202, {"Location": jobs[0]["status_url"]}
+
+    @api.get("/jobs")
+    @token_required
+    def deck_jobs():
+        """ the user's most recent deck builds"""
+        return jsonify(jobs=[job_json(job) for job in get_deck_jobs(db, g.user_id)])
+
+    @api.get("/jobs/<int:job_id>")
+    @token_required
+    def deck_job(job_id):
+        job = get_deck_job(db, g.user_id, job_id)
+        if job is None:
+            return jsonify(error=f"no job {job_id}"), 404
+        return jsonify(job_json(job))
+
+    @api.get("/decks/<int:deck_id>/download")
+    @token_required
+    def download_deck(deck_id):
+        deck = get_deck_by_id(db, deck_id, logger, user_id=g.user_id)
+        if not deck:
+            return jsonify(error=f"no deck {deck_id}"), 404
+        return send_deck_file(g.user_id, deck)
+
+    return api
@@ -5,32 +5,64 @@
 # import secrets
 # import sqlite3
 import os
+import click
 from datetime import datetime
 from cs50 import SQL
-from flask import Flask, flash, redirect, render_template, request, session, url_for, current_app, send_file, abort
-from flask_session import Session
+from flask import Flask, flash, g, redirect, render_template, request, session, url_for, current_app, send_file, abort, make_response
 from werkzeug.security import check_password_hash 
 from email_validator import validate_email, EmailNotValidError
 from get_bookcover import *
 from helpers import *
 from db_helpers import *
+from cache_policy import apply_cache_policy, fingerprint_static_url
+from static_assets import compress_static_assets, send_static_asset
+from sqlite_session import SqliteSessionInterface
+from api import make_api_blueprint
+from admission import deck_build_gate, AdmissionRejected
+import async_runtime
 
 # Configure application
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 logger = app.logger
 
-# Configure session to use filesystem (instead of signed cookies)
+# Configure sessions to be kept server-side in a SQLite database (instead of signed cookies)
+SESSION_DB_NAME = "sessions.db"
 app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
-Session(app)
+app.session_interface = SqliteSessionInterface(SESSION_DB_NAME)
 
 # Configure CS50 Library to use SQLite database
-db = db_setup(logger, "k2a.db")
+DB_NAME = "k2a.db"
+db = db_setup(logger, DB_NAME)
+
+# hand deck downloads to the front proxy once the user is authorized (see download_deck):
+# K2A_X_ACCEL_REDIRECT is the prefix of an nginx internal location aliasing static/userdata,
+# K2A_X_SENDFILE=1 makes Apache / lighttpd (mod_xsendfile) send the file
+app.config["DECK_ACCEL_REDIRECT"] = os.environ.get("K2A_X_ACCEL_REDIRECT")
+app.config["DECK_X_SENDFILE"] = os.environ.get("K2A_X_SENDFILE") == "1"
+
+# versioned JSON API for headless clients (see api.py)
+app.register_blueprint(make_api_blueprint(db, DB_NAME, logger))
+
+# browser cache lifetime (seconds) of book covers served by /covers/<asin>
+COVER_MAX_AGE = 24 * 60 * 60
+# browser cache lifetime (seconds) of placeholders for books known to have no cover
+COVER_MISSING_MAX_AGE = 60 * 60
+
+# the history page lists unfinished deck builds among the user's most recent ones
+DECK_JOBS_SHOWN = 10
 
 # supported languages
 SUPPORTED_LANGUAGES = ['en', 'de', 'fr', 'it', 'es', 'pt']
 
+# url_for('static', ...) URLs carry the file's content hash and are cached for good
+app.url_defaults(fingerprint_static_url)
+# static files are served from their precompressed .br / .gz copies where possible (flask compress-static)
+app.view_functions["static"] = send_static_asset
+
+# flash messages are rendered aggregated and capped (see helpers.aggregate_flashes)
+app.jinja_env.globals["get_flashed_messages"] = get_flashed_summary
+
 # Custom filters
 app.jinja_env.filters["get_lang_name"] = get_language_name
 app.jinja_env.filters["iconify_lang"] = iconify_language
@@ -39,11 +71,14 @@ app.jinja_env.filters["describe_card_type"] = describe_card_type
 # definition of routes
 @app.after_request
 def after_request(response):
-    """Ensure responses aren't cached"""
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Expires"] = 0
-    response.headers["Pragma"] = "no-cache"
-    return response
+    """Bound the flash messages kept for the next request and set caching headers
+    by kind of response (see cache_policy.apply_cache_policy)"""
+    if request.endpoint != "static" and request.blueprint != "api" and "_flashes" in session:
+        flashes = [tuple(item) for item in session["_flashes"]]
+        aggregated = aggregate_flashes(flashes)
+        if aggregated != flashes:
+            session["_flashes"] = aggregated
+    return apply_cache_policy(response)
 
 @app.route("/register", methods=["GET", "POST"])
 def register():
@@ -132,9 +167,6 @@ def index():
                 session.clear()
                 flash(f"✅ Action '{action}' completed successfully. Your account has been deleted.", "success")
                 return redirect("/login")
-            elif func == clear_vocab_db:
-                func(user_id, logger)
-                flash(f"✅ Action '{action}' completed successfully", "success")
             else:
                 func(db, user_id, logger)
                 flash(f"✅ Action '{action}' completed successfully", "success")
@@ -152,7 +184,7 @@ def index():
         session['vocabdb_uploaded'] = True
 
     """check for card decks"""
-    session['has_decks'] = has_decks(user_id, logger)
+    session['has_decks'] = has_decks(db, user_id, logger)
     if session['has_decks']:
         flash(f"✅ {session['num_decks']} card deck(s) found", "info")
     else:
@@ -184,13 +216,33 @@ def upload():
             flash('Uploaded file is not a valid SQLite database', 'error')
             return redirect(request.url) 
 
-        # save the file to the user's userdata directory
+        # validate the upload in memory before anything is written to disk
+        data = file.read()
+        conn, summary, errors = load_vocabdb(data, logger)
+        if conn is None:
+            for error in errors:
+                flash(error, "error")
+            return redirect(request.url)
+
+        # save a slimmed copy of the file to the user's userdata directory
         user_id = session['user_id']
-        upload_path = get_user_data_path(user_id)
-        upload_path.mkdir(parents=True, exist_ok=True)
-        file_path = upload_path / "vocab.db"
-        file.save(file_path)
-        flash(f"✅ Successfully uploaded vocab.db", "success")
+        try:
+            save_vocabdb(conn, user_id, logger)
+        except Exception as e:
+            logger.exception(e)
+            conn.close()
+            flash(f"❌ Failed to save vocab.db: {e}", "error")
+            return redirect(request.url)
+
+        # normalize the upload into the central lookup tables
+        try:
+            ingest_vocabdb(conn, DB_NAME, user_id, logger)
+        except Exception as e:
+            logger.error(f"upload: failed to ingest vocab.db of user {user_id}: {e}")
+        finally:
+            conn.close()
+        flash(f"✅ Successfully uploaded vocab.db "
+              f"({summary['num_books']} books, {summary['num_lookups']} lookups)", "success")
         session['vocabdb_uploaded'] = True
         # return render_template("create.html")
         return redirect("/create")
@@ -291,7 +343,34 @@ def create():
                     return redirect(request.url)
 
                 # flash(f"calling func {func} with deck_request {deck_request}", "info"  )
-                book, cards, deck_id = func(db, vdb, deck_request, logger)
+                # at most a few deck builds run at once (per user and in total), see admission.py
+                if async_runtime.active():
+                    # served by asgi.py: the deck is built in the event loop, the page doesn't wait for it
+                    try:
+                        deck_build_gate.enqueue(user_id)
+                    except AdmissionRejected as e:
+                        flash(f"⏳ {e} - please try again in {e.retry_after} seconds", "error")
+                        return render_books(vdb), e.status, {"Retry-After": str(e.retry_after)}
+                    try:
+                        job_id = insert_deck_job(db, user_id, deck_request['book_id'], deck_request['dict_id'], deck_request['card_type'])
+                        submit_deck_job(current_app._get_current_object(), db, job_id, user_id,
+                                        deck_request['book_id'], deck_request['dict_id'], deck_request['card_type'], logger)
+                    except Exception:
+                        deck_build_gate.cancel(user_id)
+                        raise
+                    # the history page lists the job
+                    session['has_history'] = True
+                    flash("⏳ your deck is being built, it is listed below until it is done", "info")
+                    return redirect(url_for("history"))
+                try:
+                    with deck_build_gate.admit(user_id):
+                        result = func(db, vdb, deck_request, logger)
+                except AdmissionRejected as e:
+                    flash(f"⏳ {e} - please try again in {e.retry_after} seconds", "error")
+                    return render_books(vdb), e.status, {"Retry-After": str(e.retry_after)}
+                if result is None:
+                    return redirect(request.url)
+                book, cards, deck_id = result
                 dicts = get_dictionaries(book['lang'])
                 dict = next((d for d in dicts if d['id'] == int(deck_request['dict_id'])), None)
                 session['has_history'] = has_history(db)
@@ -305,22 +384,70 @@ def create():
         return redirect(request.url)
 
     else:
-        books = get_books_from_vocabdb(db, vdb, logger)
-        if books is None:
-            flash("Could not read books from vocab.db", "error")
-            return redirect(request.url)
-        # get book covers
-        # flash(f"Getting book covers ...", "info")
-        for book in books:
-            #  logger.info(f"book: {book}")
-            image = book['asin'] + ".jpg"
-            imagepath = Path(current_app.root_path) / "static" / "covers" / image
-            #  logger.info(f"book cover path: {imagepath}")
-            if not imagepath.exists():
-                image = get_book_cover(book, logger)
-            book['cover'] = url_for('static', filename=f"covers/{image}")   
-            logger.info(f"book cover: {book['cover']}") 
-        return render_template("create.html" , books=books)
+        return render_books(vdb)
+
+def render_books(vdb):
+    """ the create page listing the books of the user's vocab db """
+    books = get_books_from_vocabdb(db, vdb, logger)
+    if books is None:
+        flash("Could not read books from vocab.db", "error")
+        return redirect(request.url)
+    # covers are served by /covers/<asin>, here we only start fetching the missing ones
+    # in the background (without waiting) and flag them, so the page can re-request them
+    covers, missing = get_book_covers(books, logger, deadline=0)
+    for book in books:
+        book['cover_pending'] = book['asin'] not in covers and book['asin'] not in missing
+    return render_template("create.html" , books=books)
+
+@app.route("/covers/<asin>", defaults={"variant": None, "ext": None})
+@app.route("/covers/<asin>/<variant>.<ext>")
+@login_or_token_required(db)
+def book_cover(asin, variant, ext):
+    """ serve a cached book cover (or one of its resized variants), or a placeholder while
+    the cover is fetched in the background (API clients authenticate with their token) """
+    if not valid_asin(asin):
+        abort(404)
+    if variant is not None and (variant not in COVER_VARIANTS or ext not in COVER_FORMATS):
+        abort(404)
+    store = get_cover_store()
+    found = None
+    if variant is not None:
+        found = store.lookup(variant_key(asin, variant, ext))
+    if found is None:
+        # covers stored without variants (e.g. no PIL) are served in original size
+        found = store.lookup(asin_key(asin))
+    if found:
+        store.record_hit(asin_key(asin))
+        imagepath, mimetype = found
+        # blobs are named by their sha256, which makes a strong validator
+        response = send_file(imagepath, mimetype=mimetype, max_age=COVER_MAX_AGE, etag=imagepath.name)
+        response.cache_control.private = True
+        response.cache_control.public = None
+        return response
+
+    book = get_vocab_book(db, asin)
+    if book is None and vocabdb_exists(g.user_id):
+        vdb = get_db_handle(get_vocabdb_path(g.user_id), logger)
+        if vdb is None:
+            abort(404)
+        rows = vdb.execute("SELECT asin, title, authors, lang FROM BOOK_INFO WHERE asin = ? LIMIT 1", asin)
+        book = rows[0] if rows else None
+    if book is None:
+        abort(404)
+
+    revalidate = request.args.get("revalidate") == "1"
+    response = make_response(get_cover_placeholder(book))
+    response.mimetype = "image/jpeg"
+    if is_known_missing(book, size=COVER_FETCH_SIZE) and not revalidate:
+        # no source had a cover recently, let the browser keep the placeholder for a while
+        response.cache_control.private = True
+        response.cache_control.max_age = COVER_MISSING_MAX_AGE
+        return response
+
+    schedule_book_cover(book, logger, revalidate=revalidate)
+    # placeholders are not cached, so the next request picks up the cover
+    response.cache_control.no_store = True
+    return response
 
 @app.route("/history", methods=["GET", "POST"])
 @login_required
@@ -338,29 +465,52 @@ def history():
                 flash(f'error deleting deck with id {deck_id}: {e}')
 
     """Show history of transactions"""
+    lang = request.args.get("lang", "").lower()
+    if lang not in SUPPORTED_LANGUAGES:
+        lang = None
+    before = None
+    cursor = request.args.get("before", "")
+    if cursor:
+        try:
+            timestamp, deck_id = cursor.split(":")
+            before = (int(timestamp), int(deck_id))
+        except ValueError:
+            flash(f"Invalid history cursor {cursor}", "error")
+            return redirect(url_for("history"))
+
     try:
-        rows = show_history(db)
+        rows, next_cursor = show_history(db, lang=lang, before=before)
     except Exception as e:
         flash(f"Could not retrieve db records from history: {e}", "error")
         return redirect("/")
 
-    if (rows):
-        history = []
-        for row in rows:
-            record = dict(row)
-            record['time'] = datetime.fromtimestamp(record['timestamp'])
-            dicts = get_dictionaries(record['lang'])
-            record['dict'] = next((d for d in dicts if d['id'] == record['dict_id']), None)
-            # flash(f'history: {record['dict']}')
-            if record['file_exists'] == 1:
-                user_id = session['user_id']
-                user_dir = f'userdata/{user_id:06d}'
-                link = url_for("static", filename=f"{user_dir}/{record['deckname']}")
-                record['file_exists'] = link
-            history.append(record)
-        return render_template("history.html", history=history)
-    else:
-        return render_template("history.html")
+    next_page = None
+    if next_cursor:
+        next_page = url_for("history", lang=lang, before=f"{next_cursor[0]}:{next_cursor[1]}")
+
+    history = []
+    dicts_by_lang = {}  # dictionaries are looked up once per language, not once per row
+    for row in rows:
+        record = dict(row)
+        record['time'] = datetime.fromtimestamp(record['timestamp'])
+        if record['lang'] not in dicts_by_lang:
+            dicts_by_lang[record['lang']] = {d['id']: d for d in get_dictionaries(record['lang'])}
+        record['dict'] = dicts_by_lang[record['lang']].get(record['dict_id'])
+        # flash(f'history: {record['dict']}')
+        if record['file_exists'] == 1:
+            record['download_url'] = url_for("download_deck", deck_id=record['deck_id'])
+        history.append(record)
+
+    # deck jobs (API, and the create page when served by asgi.py) not done yet or failed
+    jobs = [dict(job) for job in get_deck_jobs(db, user_id, limit=DECK_JOBS_SHOWN) if job['status'] != 'done']
+    if jobs:
+        vdb = get_db_handle(get_vocabdb_path(user_id), logger) if vocabdb_exists(user_id) else None
+        rows = vdb.execute("SELECT id, title FROM BOOK_INFO WHERE id IN (?)", [job['book_id'] for job in jobs]) if vdb else []
+        titles = {row['id']: row['title'] for row in rows}
+        for job in jobs:
+            job['title'] = titles.get(job['book_id'], job['book_id'])
+            job['time'] = datetime.fromtimestamp(job['updated_at'])
+    return render_template("history.html", history=history, jobs=jobs, lang=lang, paged=bool(before), next_page=next_page)
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
@@ -487,39 +637,64 @@ def change_pw():
 @app.route("/download/decks/<int:deck_id>")
 @login_required
 def download_deck(deck_id):
-    user_dir = f"{int(session['user_id']):06d}"
+    """ send one of the user's decks (see send_deck_file) """
     deck_id = int(deck_id)
     # flash(f'received deck_id {deck_id}')
     deck = get_deck_by_id(db, deck_id, logger)
     if not deck:
-        flash("no deck of yours found with deck_id {deck_id}", "error")
-
-    deckname = deck['deckname']
-    lang = deck['lang'].upper()
-    authors = deck['authors']
-    if ', ' in authors:
-        last, first = authors.split(', ')
-        authors = first + ' ' + last
-    title = deck['title']
-
-    filepath = (
-    Path(current_app.root_path)
-    / "static"
-    / "userdata"
-    / user_dir
-    / deckname
-    )
-
-    if not filepath.exists():
-        abort(404)
-
-    # download_name= f"{lang}_{authors}_{title}.apkg"
-    download_name= f"{authors} - {title}.apkg"
-
-    return send_file(
-        filepath,
-        as_attachment=True,
-        download_name=download_name
-    )
-
-    return redirect(url_for('history'))
\ No newline at end of file
+        flash(f"no deck of yours found with deck_id {deck_id}", "error")
+        return redirect(url_for('history'))
+
+    return send_deck_file(session['user_id'], deck)
+
+@app.cli.command("revalidate-covers")
+@click.option("--max-age", default=COVER_REVALIDATE_AGE, show_default=True, help="Revalidate covers not validated for this many seconds.")
+@click.option("--limit", default=COVER_REVALIDATE_BATCH, show_default=True, help="Maximum number of covers to revalidate.")
+def revalidate_covers_command(max_age, limit):
+    """Ask cover origins (ETag / Last-Modified) whether stored covers changed."""
+    counts = revalidate_covers(logger, max_age=max_age, limit=limit)
+    click.echo(f"{counts['unchanged']} unchanged, {counts['updated']} updated, {counts['failed']} failed")
+
+@app.cli.command("warm-covers")
+@click.option("--rate", default=COVER_WARM_RATE, show_default=True, type=click.FloatRange(min=0, min_open=True),
+              help="Maximum cover fetches per second.")
+@click.option("--workers", default=COVER_WARM_WORKERS, show_default=True, type=click.IntRange(min=1),
+              help="Concurrent cover fetches.")
+def warm_covers_command(rate, workers):
+    """Fetch the covers of all books in the system that are not in the cover store yet."""
+    books = get_all_books(db, logger)
+    click.echo(f"{len(books)} books known")
+
+    def progress(done, total, asin, status):
+        click.echo(f"[{done}/{total}] {asin}: {status}")
+
+    counts = warm_book_covers(books, logger, rate=rate, workers=workers, progress=progress)
+    click.echo(f"{counts['stored']} stored, {counts['missing']} missing, {counts['failed']} failed, "
+               f"{counts['skipped']} skipped (already cached or known missing)")
+
+@app.cli.command("compress-static")
+def compress_static_command():
+    """Write precompressed .br / .gz copies of the static text assets (run after each deploy)."""
+    written = compress_static_assets(app.static_folder, logger)
+    click.echo(f"{written} compressed copies written")
+
+@app.cli.command("reconcile-decks")
+@click.option("--delete-orphans", is_flag=True, help="Delete deck files that belong to no deck.")
+def reconcile_decks_command(delete_orphans):
+    """Make the decks table agree with the deck files on disk."""
+    unlinked, orphans = reconcile_decks(db, logger, delete_orphans=delete_orphans)
+    click.echo(f"{unlinked} deck(s) without file unlinked, {len(orphans)} orphaned deck file(s)"
+               + (" deleted" if delete_orphans and orphans else ""))
+
+@app.cli.command("create-api-token")
+@click.argument("username")
+@click.option("--revoke", is_flag=True, help="Revoke the user's existing tokens instead.")
+def create_api_token_command(username, revoke):
+    """Create an API token for USERNAME (sent as "Authorization: Bearer <token>")."""
+    rows = db.execute("SELECT id FROM users WHERE username = ?", username)
+    if not rows:
+        raise click.ClickException(f"no user {username}")
+    if revoke:
+        click.echo(f"{revoke_api_tokens(db, rows[0]['id'])} token(s) revoked")
+    else:
+        click.echo(create_api_token(db, rows[0]['id']))
@@ -0,0 +1,35 @@
+# asgi.py - ASGI entry point, e.g. uvicorn asgi:asgi_app --workers 2 (needs httpx, a2wsgi, uvicorn)
+
+# imports
+from a2wsgi import WSGIMiddleware
+from app import app
+import async_runtime
+
+# threads running the Flask views; views only render pages and hand deck builds and cover
+# fetches to the event loop (async_runtime), so they don't stay busy for long
+ASGI_VIEW_THREADS = 16
+
+# a2wsgi runs the views on a plain thread pool (asgiref's WsgiToAsgi would run them all on one thread)
+wsgi_app = WSGIMiddleware(app, workers=ASGI_VIEW_THREADS)
+
+async def lifespan(receive, send):
+    """ start the event loop's HTTP client with the server and close it on shutdown"""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                await async_runtime.start()
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await async_runtime.stop()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def asgi_app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
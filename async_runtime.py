@@ -0,0 +1,45 @@
+# async_runtime.py - event loop and HTTP client of the ASGI server (see asgi.py); while it runs,
+# deck builds and cover fetches are coroutines awaiting their requests instead of worker threads
+
+# imports
+import asyncio
+
+# connections the shared client keeps open (covers come from a handful of hosts)
+ASYNC_MAX_CONNECTIONS = 64
+ASYNC_MAX_KEEPALIVE = 16
+
+_loop = None
+_client = None
+
+def active() -> bool:
+    """ whether the app is served by asgi.py (and I/O bound work goes to its event loop)"""
+    return _loop is not None
+
+def client():
+    """ the shared httpx.AsyncClient (cover fetches)"""
+    return _client
+
+def submit(coro):
+    """ run coro in the server's event loop, from any thread
+    :return: concurrent.futures.Future of its result"""
+    return asyncio.run_coroutine_threadsafe(coro, _loop)
+
+async def start():
+    """ called in the server's event loop on startup"""
+    global _loop, _client
+    import httpx
+    from get_bookcover import get_fetcher
+    _client = httpx.AsyncClient(
+        headers={"User-Agent": get_fetcher().user_agent},
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive_connections=ASYNC_MAX_KEEPALIVE)
+    )
+    _loop = asyncio.get_running_loop()
+
+async def stop():
+    """ called in the server's event loop on shutdown"""
+    global _loop, _client
+    _loop = None
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# bench_startup.py - cold start benchmark: time to import app.py in a fresh interpreter
+
+# imports
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# seconds a fresh worker may take to import the app (median of the runs)
+STARTUP_BUDGET = 1.0
+# modules only needed for building decks or by the command line tool, none of them
+# may be loaded just by importing the app
+LAZY_MODULES = ("kindle2anki", "simple_term_menu", "pyrae", "genanki", "bs4", "regex", "PIL", "httpx")
+
+# runs in the child interpreter, prints the import time and the lazy modules that got loaded
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+def measure(app_dir, runs):
+    """ import the app in `runs` fresh interpreters (in an empty working directory, so the
+    databases are created from scratch like on a new worker)
+    :return: list of (seconds, loaded lazy modules) per run"""
+    results = []
+    env = {**os.environ, "PYTHONPATH": str(app_dir), "PYTHONDONTWRITEBYTECODE": "1"}
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as workdir:
+            out = subprocess.run(
+                [sys.executable, "-c", PROBE], cwd=workdir, env=env,
+                capture_output=True, text=True, check=True
+            ).stdout
+        # the app may log to stdout while importing, the probe's result is the last line
+        result = json.loads(out.strip().splitlines()[-1])
+        results.append((result["seconds"], result["loaded"]))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="measure the import time of app.py against a budget")
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh interpreters (default 5)")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET,
+                        help=f"maximum median import time in seconds (default {STARTUP_BUDGET})")
+    args = parser.parse_args()
+
+    results = measure(Path(__file__).resolve().parent, args.runs)
+    times = [seconds for seconds, _ in results]
+    loaded = sorted({module for _, modules in results for module in modules})
+    median = statistics.median(times)
+    print(f"import app: median {median:.3f}s, min {min(times):.3f}s, max {max(times):.3f}s ({args.runs} runs)")
+
+    failed = False
+    if median > args.budget:
+        print(f"❌ over the startup budget of {args.budget:.3f}s")
+        failed = True
+    if loaded:
+        print(f"❌ modules that should be imported lazily were loaded: {', '.join(loaded)}")
+        failed = True
+    if not failed:
+        print(f"✅ within the startup budget of {args.budget:.3f}s")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
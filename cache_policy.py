@@ -0,0 +1,74 @@
+# cache_policy.py - HTTP caching rules per kind of response and fingerprinted static URLs
+
+# imports
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+from flask import current_app, request, session
+
+# static files requested with their content hash (?v=...) never change under that URL
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# length of the content hash put into static URLs
+ASSET_VERSION_LENGTH = 12
+
+@lru_cache(maxsize=512)
+def _hash_file(path, mtime_ns, size):
+    # mtime and size are part of the cache key, so edited files get a new hash
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:ASSET_VERSION_LENGTH]
+
+def asset_version(filename):
+    """ content hash of a file in the static folder, or None if there is no such file"""
+    static_folder = Path(current_app.static_folder).resolve()
+    path = (static_folder / filename).resolve()
+    if not path.is_relative_to(static_folder):
+        return None
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return _hash_file(str(path), stat.st_mtime_ns, stat.st_size)
+
+def fingerprint_static_url(endpoint, values):
+    """ url_defaults hook: url_for('static', filename=...) gets ?v=<content hash> appended,
+    so the URL changes whenever the file does and can be cached forever"""
+    if endpoint != "static" or "v" in values or "filename" not in values:
+        return
+    version = asset_version(values["filename"])
+    if version:
+        values["v"] = version
+
+def apply_cache_policy(response):
+    """ set Cache-Control for a response:
+    - fingerprinted static files: public, cached for a year, immutable
+    - other static files: public, revalidated with their ETag / Last-Modified on each use
+    - responses whose view set max-age or no-store (e.g. covers): left alone
+    - pages of logged in users and API responses: not stored at all
+    - anonymous pages: private, revalidated on each use"""
+    if request.endpoint == "static":
+        version = request.args.get("v")
+        if response.status_code == 200 and version and version == asset_version(request.view_args["filename"]):
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+            response.cache_control.no_cache = None
+        else:
+            response.cache_control.public = True
+            response.cache_control.no_cache = True
+        return response
+
+    if response.cache_control.max_age is not None or response.cache_control.no_store:
+        return response
+
+    # API responses are per token, the session is not looked at
+    if request.blueprint == "api" or session.get("user_id") is not None:
+        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+        response.headers["Expires"] = 0
+        response.headers["Pragma"] = "no-cache"
+    else:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    return response
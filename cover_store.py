@@ -0,0 +1,387 @@
+# cover_store.py - content-addressed store for book cover images
+
+# imports
+import hashlib
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, locks are then per process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# location and byte budget of the shared store (both can be set from the environment)
+COVER_STORE_DIR = os.environ.get("K2A_COVER_STORE_DIR", "./covers")
+COVER_STORE_MAX_BYTES = int(os.environ.get("K2A_COVER_STORE_MAX_BYTES", 512 * 1024 * 1024))
+# eviction frees space down to this fraction of the budget, so it does not run on every put
+EVICTION_LOW_WATER = 0.9
+# last access times are only written if older than this (seconds), to keep reads cheap
+ACCESS_RESOLUTION = 60
+# keys per query of the batched lookups (below SQLite's limit of bound parameters)
+SQL_BATCH_SIZE = 500
+# metadata columns added to keys after the first release (migrated in place on open)
+KEY_META_COLUMNS = {
+    "source": "TEXT",
+    "url": "TEXT",
+    "etag": "TEXT",
+    "last_modified": "TEXT",
+    "hits": "INTEGER NOT NULL DEFAULT 0",
+    "validated_at": "REAL",
+}
+
+INDEX_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS blobs (
+    hash         TEXT PRIMARY KEY NOT NULL,
+    size         INTEGER NOT NULL,
+    mime         TEXT NOT NULL,
+    last_access  REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS blobs_last_access ON blobs (last_access);
+    CREATE TABLE IF NOT EXISTS keys (
+    key          TEXT PRIMARY KEY NOT NULL,
+    hash         TEXT NOT NULL REFERENCES blobs(hash),
+    stored_at    REAL NOT NULL,
+    source       TEXT,
+    url          TEXT,
+    etag         TEXT,
+    last_modified TEXT,
+    hits         INTEGER NOT NULL DEFAULT 0,
+    validated_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS keys_hash ON keys (hash);
+    CREATE TABLE IF NOT EXISTS misses (
+    key          TEXT PRIMARY KEY NOT NULL,
+    checked_at   REAL NOT NULL
+    );
+"""
+
+class CoverStore:
+    """
+    Content-addressed store for cover images.
+
+    Image bytes are written once per sha256 to objects/<aa>/<bb>/<hash>, any number of
+    keys (ASINs, fetcher cache keys) point to a blob via a small SQLite index, and the
+    least recently used blobs are evicted once the store exceeds max_bytes.
+    The index also holds the negative cache (books for which no source had a cover),
+    and lock() lets concurrent fetchers of the same key (threads or processes) coalesce.
+    """
+
+    def __init__(self, root: str = COVER_STORE_DIR, max_bytes: int = COVER_STORE_MAX_BYTES):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / "index.db"
+        self.max_bytes = max_bytes
+        self._evict_lock = threading.Lock()
+        self.locks = self.root / "locks"
+        self.locks.mkdir(exist_ok=True)
+        # key -> [lock, number of threads holding or waiting for it]
+        self._key_locks = {}
+        self._key_locks_lock = threading.Lock()
+        # key -> hits not yet written to the index (see record_hit)
+        self._pending_hits = {}
+        self._hits_lock = threading.Lock()
+        self._hits_written = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(INDEX_SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(keys)")}
+            for column, decl in KEY_META_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE keys ADD COLUMN {column} {decl}")
+            conn.execute("CREATE INDEX IF NOT EXISTS keys_validated_at ON keys (validated_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest[2:4] / digest
+
+    @contextmanager
+    def lock(self, key: str):
+        """
+        Hold an exclusive lock on key across threads and processes (flock on a lock file),
+        so that only one of them fetches what is to be stored under key.
+        Callers should check the store again once they hold the lock.
+        """
+        with self._key_locks_lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                if fcntl is None:
+                    yield
+                    return
+                digest = hashlib.sha256(key.encode()).hexdigest()
+                # lock files are never removed, unlinking a file another process waits on breaks the lock
+                with open(self.locks / f"{digest[:32]}.lock", "a") as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            with self._key_locks_lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+    def lookup(self, key: str) -> Optional[Tuple[Path, str]]:
+        """Return (path, mime) of the blob stored under key, or None."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT b.hash, b.mime, b.last_access FROM keys k JOIN blobs b ON b.hash = k.hash WHERE k.key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            digest, mime, last_access = row
+            # most reads don't write at all
+            if last_access < now - ACCESS_RESOLUTION:
+                conn.execute(
+                    "UPDATE blobs SET last_access = ? WHERE hash = ? AND last_access < ?",
+                    (now, digest, now - ACCESS_RESOLUTION)
+                )
+        path = self._blob_path(digest)
+        if not path.exists():
+            # blob vanished from disk (e.g. manual cleanup), forget the key
+            self.delete(key)
+            return None
+        return path, mime
+
+    def lookup_many(self, keys) -> Dict[str, Tuple[Path, str]]:
+        """Like lookup for many keys on one connection: dict of key -> (path, mime) for the stored ones."""
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        found = {}
+        stale = set()
+        with closing(self._connect()) as conn:
+            for start in range(0, len(keys), SQL_BATCH_SIZE):
+                batch = keys[start:start + SQL_BATCH_SIZE]
+                rows = conn.execute(
+                    "SELECT k.key, b.hash, b.mime, b.last_access FROM keys k JOIN blobs b ON b.hash = k.hash "
+                    f"WHERE k.key IN ({', '.join('?' * len(batch))})",
+                    batch
+                )
+                for key, digest, mime, last_access in rows:
+                    found[key] = (self._blob_path(digest), mime)
+                    if last_access < now - ACCESS_RESOLUTION:
+                        stale.add(digest)
+            if stale:
+                conn.executemany(
+                    "UPDATE blobs SET last_access = ? WHERE hash = ? AND last_access < ?",
+                    [(now, digest, now - ACCESS_RESOLUTION) for digest in stale]
+                )
+        for key, (path, mime) in list(found.items()):
+            if not path.exists():
+                # blob vanished from disk (e.g. manual cleanup), forget the key
+                self.delete(key)
+                del found[key]
+        return found
+
+    def record_hit(self, key: str):
+        """
+        Count a request for key (only covers served to clients, not internal reads).
+        Hits are added up in memory and written at most every ACCESS_RESOLUTION seconds.
+        """
+        now = time.time()
+        with self._hits_lock:
+            self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+            if now - self._hits_written < ACCESS_RESOLUTION:
+                return
+            pending, self._pending_hits = self._pending_hits, {}
+            self._hits_written = now
+        with closing(self._connect()) as conn:
+            conn.executemany("UPDATE keys SET hits = hits + ? WHERE key = ?", [(n, k) for k, n in pending.items()])
+
+    def has(self, key: str) -> bool:
+        return self.lookup(key) is not None
+
+    def read(self, key: str) -> Optional[bytes]:
+        """Return the bytes stored under key, or None."""
+        found = self.lookup(key)
+        if found is None:
+            return None
+        try:
+            return found[0].read_bytes()
+        except OSError:
+            return None
+
+    def put(self, key: str, data: bytes, mime: str = "image/jpeg", meta: Optional[dict] = None) -> str:
+        """
+        Store data under key (bytes already in the store are not written again), return its hash.
+        meta can hold the source, url and HTTP validators (etag, last_modified) of the image.
+        """
+        meta = meta or {}
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{digest}.{secrets.token_hex(4)}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO blobs (hash, size, mime, last_access) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(hash) DO UPDATE SET last_access = excluded.last_access",
+                (digest, len(data), mime, now)
+            )
+            conn.execute(
+                "INSERT INTO keys (key, hash, stored_at, source, url, etag, last_modified, validated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET hash = excluded.hash, stored_at = excluded.stored_at, "
+                "source = excluded.source, url = excluded.url, etag = excluded.etag, "
+                "last_modified = excluded.last_modified, validated_at = excluded.validated_at",
+                (key, digest, now, meta.get("source"), meta.get("url"), meta.get("etag"),
+                 meta.get("last_modified"), now)
+            )
+            conn.execute("DELETE FROM misses WHERE key = ?", (key,))
+            conn.execute("COMMIT")
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+        if total > self.max_bytes:
+            self.evict()
+        return digest
+
+    def delete(self, key: str):
+        """Remove key from the store (its blob goes once no other key references it)."""
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT hash FROM keys WHERE key = ?", (key,)).fetchone()
+            conn.execute("DELETE FROM keys WHERE key = ?", (key,))
+            orphan = None
+            if row and not conn.execute("SELECT 1 FROM keys WHERE hash = ? LIMIT 1", (row[0],)).fetchone():
+                orphan = row[0]
+                conn.execute("DELETE FROM blobs WHERE hash = ?", (orphan,))
+            conn.execute("COMMIT")
+        if orphan:
+            self._blob_path(orphan).unlink(missing_ok=True)
+
+    def evict(self):
+        """Delete least recently used blobs (and their keys) until the store is below its low-water mark."""
+        target = int(self.max_bytes * EVICTION_LOW_WATER)
+        with self._evict_lock, closing(self._connect()) as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for digest, size in conn.execute("SELECT hash, size FROM blobs ORDER BY last_access"):
+                if total <= target:
+                    break
+                victims.append(digest)
+                total -= size
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("DELETE FROM keys WHERE hash = ?", [(d,) for d in victims])
+            conn.executemany("DELETE FROM blobs WHERE hash = ?", [(d,) for d in victims])
+            conn.execute("COMMIT")
+        for digest in victims:
+            self._blob_path(digest).unlink(missing_ok=True)
+        logger.info(f"CoverStore: evicted {len(victims)} blob(s), {total} bytes in store")
+
+    def size(self) -> int:
+        """Total bytes of all blobs in the store."""
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    # metadata / revalidation
+    def meta(self, key: str) -> Optional[dict]:
+        """Index metadata of key (hash, mime, size, source, url, validators, hits, timestamps), or None."""
+        with closing(self._connect()) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                "SELECT k.key, k.hash, b.mime, b.size, k.stored_at, k.source, k.url, k.etag, "
+                "k.last_modified, k.hits, k.validated_at "
+                "FROM keys k JOIN blobs b ON b.hash = k.hash WHERE k.key = ?", (key,)
+            ).fetchone()
+        return None if row is None else dict(row)
+
+    def due_for_revalidation(self, max_age: float, limit: int = 100) -> list:
+        """
+        ASIN cover keys (not their variants) fetched over http(s) that were not validated
+        for max_age seconds, most requested first.
+        """
+        cutoff = time.time() - max_age
+        with closing(self._connect()) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                "SELECT key, source, url, etag, last_modified, hits, validated_at FROM keys "
+                "WHERE key GLOB 'asin:*' AND key NOT GLOB 'asin:*:*' AND url LIKE 'http%' "
+                "AND COALESCE(validated_at, stored_at) < ? "
+                "ORDER BY hits DESC, COALESCE(validated_at, stored_at) LIMIT ?",
+                (cutoff, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def mark_validated(self, key: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Record that key's origin still serves the same image (304), refreshing validators if sent."""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE keys SET validated_at = ?, etag = COALESCE(?, etag), "
+                "last_modified = COALESCE(?, last_modified) WHERE key = ?",
+                (time.time(), etag, last_modified, key)
+            )
+
+    # negative cache
+    def miss_age(self, key: str) -> Optional[float]:
+        """Seconds since a miss was recorded for key, or None."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT checked_at FROM misses WHERE key = ?", (key,)).fetchone()
+        return None if row is None else time.time() - row[0]
+
+    def miss_ages(self, keys) -> Dict[str, float]:
+        """Like miss_age for many keys on one connection: dict of key -> seconds for those with a miss."""
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        ages = {}
+        with closing(self._connect()) as conn:
+            for start in range(0, len(keys), SQL_BATCH_SIZE):
+                batch = keys[start:start + SQL_BATCH_SIZE]
+                rows = conn.execute(
+                    f"SELECT key, checked_at FROM misses WHERE key IN ({', '.join('?' * len(batch))})", batch
+                )
+                ages.update((key, now - checked_at) for key, checked_at in rows)
+        return ages
+
+    def record_miss(self, key: str):
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO misses (key, checked_at) VALUES (?, ?)", (key, time.time()))
+
+    def clear_miss(self, key: str):
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM misses WHERE key = ?", (key,))
+
+# process-wide store
+_store = None
+_store_lock = threading.Lock()
+
+def get_cover_store() -> CoverStore:
+    """Return the shared CoverStore, creating it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CoverStore()
+    return _store
+
+def asin_key(asin: str) -> str:
+    """Store key of the cover served for a Kindle ASIN."""
+    return f"asin:{asin}"
+
+def variant_key(asin: str, variant: str, ext: str) -> str:
+    """Store key of a resized cover variant (see get_bookcover.COVER_VARIANTS)."""
+    return f"asin:{asin}:{variant}.{ext}"
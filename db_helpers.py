@@ -1,13 +1,22 @@
 # db_helpers.py - functions to help with db setup and management
 
 # imports
+import hashlib
 import os
+import secrets
 import sqlite3
+import time
+from contextlib import closing
 from cs50 import SQL
 from flask import flash, redirect, request, session, url_for
 from pathlib import Path
 from werkzeug.security import generate_password_hash
 
+# uploaded vocab.db files are never written by the app, so they are opened
+# read-only and immutable (no locking) with a memory map and a larger page cache
+VOCABDB_MMAP_SIZE = 256 * 1024 * 1024   # bytes
+VOCABDB_CACHE_SIZE = -32 * 1024         # negative value = size in KiB (32 MiB)
+
 # function to make sure the db exists with all required tables
 def db_setup(logger, db_name):
     # create db if it does not exist
@@ -80,6 +89,84 @@ def db_setup(logger, db_name):
         flash(f"❌ a database error occured: {e}")
         return redirect(request.url)
 
+    """create central lookup tables (normalized from all users' vocab.db uploads) if not exist"""
+    try:
+        db.execute("""
+        CREATE TABLE IF NOT EXISTS vocab_books (
+        user_id      INTEGER NOT NULL,
+        asin         TEXT NOT NULL,
+        lang         TEXT,
+        title        TEXT,
+        authors      TEXT,
+        num_lookups  INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, asin),
+        FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        """)
+        db.execute("""
+        CREATE TABLE IF NOT EXISTS vocab_lookups (
+        user_id      INTEGER NOT NULL,
+        asin         TEXT NOT NULL,
+        word         TEXT NOT NULL,
+        lang         TEXT,
+        usage        TEXT,
+        PRIMARY KEY (user_id, asin, word),
+        FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS vocab_books_asin ON vocab_books (asin)")
+        db.execute("CREATE INDEX IF NOT EXISTS vocab_lookups_word ON vocab_lookups (lang, word)")
+        db.execute("CREATE INDEX IF NOT EXISTS vocab_lookups_asin ON vocab_lookups (asin, word)")
+    except Exception as e:
+        logger.error(f"Failed to create central lookup tables: {e}")
+
+    """create indexes for history queries if not exist"""
+    try:
+        db.execute("CREATE INDEX IF NOT EXISTS history_user_time ON history (user_id, timestamp DESC, deck_id DESC)")
+        db.execute("CREATE INDEX IF NOT EXISTS history_user_lang_time ON history (user_id, lang, timestamp DESC, deck_id DESC)")
+        db.execute("CREATE INDEX IF NOT EXISTS history_deck_time ON history (deck_id, timestamp DESC)")
+    except Exception as e:
+        logger.error(f"Failed to create indexes on history: {e}")
+
+    """create index for deck counts if not exist"""
+    try:
+        db.execute("CREATE INDEX IF NOT EXISTS decks_user_exists ON decks (user_id, file_exists, asin)")
+    except Exception as e:
+        logger.error(f"Failed to create index on decks: {e}")
+
+    """create tables of the JSON API (access tokens, background deck builds) if not exist"""
+    try:
+        db.execute("""
+        CREATE TABLE IF NOT EXISTS api_tokens (
+        token_hash   TEXT PRIMARY KEY NOT NULL,
+        user_id      INTEGER NOT NULL,
+        created_at   INTEGER NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        """)
+        db.execute("""
+        CREATE TABLE IF NOT EXISTS deck_jobs (
+        id           INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id      INTEGER NOT NULL,
+        book_id      TEXT NOT NULL,
+        dict_id      INTEGER NOT NULL,
+        card_type    TEXT NOT NULL CHECK (card_type IN ('A', 'B')),
+        status       TEXT NOT NULL DEFAULT 'queued'
+                     CHECK (status IN ('queued', 'running', 'done', 'failed')),
+        message      TEXT,
+        deck_id      INTEGER,
+        cards        INTEGER,
+        created_at   INTEGER NOT NULL,
+        updated_at   INTEGER NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id),
+        FOREIGN KEY (deck_id) REFERENCES decks(id)
+        )
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS deck_jobs_user ON deck_jobs (user_id, id DESC)")
+        db.execute("CREATE INDEX IF NOT EXISTS api_tokens_user ON api_tokens (user_id)")
+    except Exception as e:
+        logger.error(f"Failed to create API tables: {e}")
+
     # return db handle
     return db
 
@@ -120,7 +207,7 @@ def insert_deck (db, user_id, asin, deckname, cards, logger):
         )
         logger.info(f"sucessfully added deck for user_id {user_id}, deckname {deckname} with row_id {row_id}")
     except Exception as e:
-        flash(f"❌ a database error occured: {e}")
+        # no flash here, this also runs in background jobs (callers report the None)
         logger.error(f'Failed to add deck for user_id {user_id} and deckname {deckname}to decks, database error: {e}')
         return None
     
@@ -159,11 +246,14 @@ def unlink_decks4asin(db, user_id, asin, logger):
 
 # set deck with a particular asin to deleted
 def unlink_deck(db, user_id, deck_id, logger):
+    """ mark a deck's file as deleted
+    :return: True, or False if the record could not be updated (callers report it)"""
     try:
         db.execute("UPDATE decks SET file_exists = 0 WHERE user_id = ? and id = ?", user_id, deck_id)
     except Exception as e:
-        flash(f'unlink_deck: failure to update record with deck_id {deck_id}: {e}')
-        logger.error(f'Failure to update records in decks: {e}')
+        logger.error(f'unlink_deck: failure to update record with deck_id {deck_id}: {e}')
+        return False
+    return True
 
 # function to delete user from db
 def clear_user_from_db(db, user_id, logger):
@@ -175,6 +265,8 @@ def clear_user_from_db(db, user_id, logger):
         db.execute("DELETE FROM decks WHERE user_id = ?", user_id)
     except Exception as e:
         flash(f"❌ Failure to delete user's decks, a database error occured: {e}")
+    # then delete all of the user's vocab lookups
+    clear_vocab_from_db(db, user_id, logger)
     # then delete all history for this user
     try:
         db.execute("DELETE FROM history WHERE user_id = ?", user_id)
@@ -211,10 +303,9 @@ def get_books_from_vocabdb(db, vdb, logger, lang=None):
             logger.info(f"get_books_from_vocabdb: reading books from vocab db for language {lang} ...")
             books = vdb.execute(SQL_query, book_keys, lang)
 
-        # add cover path to each book
+        # add cover url to each book
         for book in books:
-            cover = book['asin'] + ".jpg"
-            book['cover'] = url_for('static', filename=f"covers/{cover}")   
+            book['cover'] = url_for('book_cover', asin=book['asin'])
             # user_dir = f"{int(user_id):06d}"
             # apkg = book['asin'] + ".apkg"
             # book['apkg'] = url_for('static', filename=f"userdata/{user_dir}/{apkg}")
@@ -248,12 +339,180 @@ def get_books_from_vocabdb(db, vdb, logger, lang=None):
     flash(f"✅ found {len(books)} books in vocab db", "info")
     return books
 
+def connect_vocabdb_readonly(vocab_db_path):
+    """ open a read-only, immutable, memory-mapped sqlite3 connection to a vocab db"""
+    uri = f"{Path(vocab_db_path).resolve().as_uri()}?mode=ro&immutable=1"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.execute(f"PRAGMA mmap_size = {VOCABDB_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = {VOCABDB_CACHE_SIZE}")
+    return conn
+
+# tables and columns of a Kindle vocab.db the app relies on
+VOCABDB_SCHEMA = {
+    "LOOKUPS": {"word_key", "book_key", "usage"},
+    "WORDS": {"id", "word", "lang"},
+    "BOOK_INFO": {"id", "asin", "lang", "title", "authors"},
+}
+
+# file format read / write version bytes (header offsets 18 and 19) of WAL-mode and rollback journal dbs
+VOCABDB_WAL_VERSION = b"\x02\x02"
+VOCABDB_ROLLBACK_VERSION = b"\x01\x01"
+
+def load_vocabdb(data, logger):
+    """ load uploaded vocab.db bytes into an in-memory db, validate its schema and integrity
+    and extract a summary of its catalog in the same pass
+    :return: (conn, summary, errors) - conn is None if the upload is not usable"""
+    errors = []
+    if len(data) > 19 and data[18:20] == VOCABDB_WAL_VERSION:
+        # copies of a WAL-mode db can't be deserialized (there is no -wal file in memory),
+        # mark them as rollback journal dbs like the file they would be without their WAL
+        data = bytearray(data)
+        data[18:20] = VOCABDB_ROLLBACK_VERSION
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.deserialize(data)
+        tables = {
+            row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        }
+        for table, columns in VOCABDB_SCHEMA.items():
+            if table not in tables:
+                errors.append(f"❌ table {table} missing in vocab.db")
+                continue
+            found = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            missing = columns - found
+            if missing:
+                errors.append(f"❌ table {table} is missing column(s) {', '.join(sorted(missing))}")
+        if not errors:
+            check = [row[0] for row in conn.execute("PRAGMA quick_check")]
+            if check != ["ok"]:
+                errors.append(f"❌ vocab.db failed integrity check: {'; '.join(check[:3])}")
+    except sqlite3.DatabaseError as e:
+        errors.append(f"❌ vocab.db could not be read: {e}")
+
+    if errors:
+        conn.close()
+        logger.warning(f"load_vocabdb: rejected upload: {errors}")
+        return None, None, errors
+
+    books = conn.execute("""
+        SELECT b.lang, b.title, COUNT(DISTINCT l.word_key) AS num_lookups
+        FROM BOOK_INFO b
+        JOIN LOOKUPS l ON l.book_key = b.id
+        GROUP BY b.id
+        ORDER BY b.lang, b.authors, b.title""").fetchall()
+    summary = {
+        "num_books": len(books),
+        "num_words": conn.execute("SELECT COUNT(*) FROM WORDS").fetchone()[0],
+        "num_lookups": conn.execute("SELECT COUNT(*) FROM LOOKUPS").fetchone()[0],
+        "books": [{"lang": lang, "title": title, "num_lookups": num} for lang, title, num in books],
+    }
+    logger.info(f"load_vocabdb: {summary['num_books']} books, {summary['num_lookups']} lookups")
+    return conn, summary, errors
+
+# columns kept in the slimmed per-user copy of a vocab.db
+SLIM_VOCABDB_DDL = """
+    CREATE TABLE slim.BOOK_INFO (id TEXT PRIMARY KEY NOT NULL, asin TEXT, lang TEXT, title TEXT, authors TEXT);
+    CREATE TABLE slim.WORDS (id TEXT PRIMARY KEY NOT NULL, word TEXT, lang TEXT);
+    CREATE TABLE slim.LOOKUPS (word_key TEXT, book_key TEXT, usage TEXT);
+    INSERT INTO slim.BOOK_INFO SELECT id, asin, lang, title, authors FROM main.BOOK_INFO;
+    INSERT INTO slim.WORDS SELECT id, word, lang FROM main.WORDS;
+    INSERT INTO slim.LOOKUPS SELECT word_key, book_key, usage FROM main.LOOKUPS;
+    CREATE INDEX slim.lookups_book_key ON LOOKUPS (book_key, word_key);
+    CREATE INDEX slim.lookups_word_key ON LOOKUPS (word_key);
+"""
+
+def write_slim_vocabdb(conn, dest, logger):
+    """ write a compact copy of a (validated, in-memory) vocab db to dest, holding only the
+    LOOKUPS, WORDS and BOOK_INFO columns the app reads, indexed and vacuumed"""
+    conn.execute("ATTACH DATABASE ':memory:' AS slim")
+    try:
+        conn.executescript(SLIM_VOCABDB_DDL)
+        conn.execute("VACUUM slim INTO ?", (str(dest),))
+    finally:
+        conn.execute("DETACH DATABASE slim")
+    logger.info(f"write_slim_vocabdb: wrote {Path(dest).stat().st_size} bytes to {dest}")
+
+# normalizes the BOOK_INFO/LOOKUPS of an in-memory vocab db into the central tables,
+# books without an asin are keyed by their Kindle book id
+INGEST_VOCABDB_SQL = """
+    INSERT OR IGNORE INTO central.vocab_books (user_id, asin, lang, title, authors, num_lookups)
+    SELECT :user_id, COALESCE(NULLIF(b.asin, ''), b.id), b.lang, b.title, b.authors, COUNT(DISTINCT l.word_key)
+    FROM main.BOOK_INFO b
+    JOIN main.LOOKUPS l ON l.book_key = b.id
+    GROUP BY b.id;
+    INSERT OR IGNORE INTO central.vocab_lookups (user_id, asin, word, lang, usage)
+    SELECT :user_id, COALESCE(NULLIF(b.asin, ''), b.id),
+           substr(l.word_key, instr(l.word_key, ':') + 1), b.lang, l.usage
+    FROM main.LOOKUPS l
+    JOIN main.BOOK_INFO b ON b.id = l.book_key;
+"""
+
+def ingest_vocabdb(conn, db_name, user_id, logger):
+    """ replace the user's rows in the central lookup tables of db_name
+    with the contents of a (validated, in-memory) vocab db"""
+    conn.execute("ATTACH DATABASE ? AS central", (db_name,))
+    try:
+        with conn:
+            conn.execute("DELETE FROM central.vocab_lookups WHERE user_id = ?", (user_id,))
+            conn.execute("DELETE FROM central.vocab_books WHERE user_id = ?", (user_id,))
+            for statement in INGEST_VOCABDB_SQL.split(";"):
+                if statement.strip():
+                    conn.execute(statement, {"user_id": user_id})
+    finally:
+        conn.execute("DETACH DATABASE central")
+    logger.info(f"ingest_vocabdb: ingested vocab db of user {user_id} into {db_name}")
+
+def clear_vocab_from_db(db, user_id, logger):
+    """ delete the user's rows from the central lookup tables"""
+    try:
+        db.execute("DELETE FROM vocab_lookups WHERE user_id = ?", user_id)
+        db.execute("DELETE FROM vocab_books WHERE user_id = ?", user_id)
+    except Exception as e:
+        logger.error(f"Failure to clear central lookups for user {user_id}: {e}")
+        return False
+    return True
+
+def get_popular_words(db, lang, limit=100):
+    """ words of a language looked up by the most users (e.g. for warming dictionary caches)"""
+    return db.execute("""
+        SELECT word, COUNT(DISTINCT user_id) AS num_users
+        FROM vocab_lookups
+        WHERE lang = ?
+        GROUP BY word
+        ORDER BY num_users DESC
+        LIMIT ?""", lang, limit)
+
+def get_known_asins(db):
+    """ all distinct asins across all users' uploads, with one title/authors for each"""
+    return db.execute("""
+        SELECT asin, MIN(title) AS title, MIN(authors) AS authors, MIN(lang) AS lang, COUNT(*) AS num_users
+        FROM vocab_books
+        GROUP BY asin""")
+
+def get_vocab_book(db, asin):
+    """ title, authors and lang of a book from the central lookup tables (any user's upload)"""
+    rows = db.execute("SELECT asin, title, authors, lang FROM vocab_books WHERE asin = ? LIMIT 1", asin)
+    return rows[0] if rows else None
+
+def get_vocabdb_books(vocab_db_path):
+    """ asin, title, authors and lang of all books in a (user's) vocab db file"""
+    with closing(connect_vocabdb_readonly(vocab_db_path)) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute("SELECT asin, title, authors, lang FROM BOOK_INFO WHERE asin IS NOT NULL AND asin != ''")
+        return [dict(row) for row in rows]
+
+def open_vocabdb(vocab_db_path):
+    """ read-only CS50 handle for a vocab db (raises if it cannot be opened)"""
+    # the CS50 module requires a plain sqlite path (it checks the file exists),
+    # the actual connections are created by our read-only connection factory
+    return SQL(f"sqlite:///{vocab_db_path}", creator=lambda: connect_vocabdb_readonly(vocab_db_path))
+
 # get database handle
 def get_db_handle(vocab_db_path, logger):
-    """ get database handle for vocab db"""
+    """ get (read-only) database handle for vocab db"""
     logger.info(f"get_db_handle: getting database handle for vocab db {vocab_db_path} ...")
     try:
-        db = SQL(f"sqlite:///{vocab_db_path}")
+        db = open_vocabdb(vocab_db_path)
     except Exception as e:
         flash(f"❌ error reading vocab db: {e}", "error")
         return None
@@ -273,8 +532,7 @@ def get_book_by_id(db, vdb, book_id, logger):
         id = book['id']
         num_lookups = list(vdb.execute("SELECT COUNT(DISTINCT(word_key)) FROM LOOKUPS WHERE book_key = ?", id)[0].values())[0]
         book['num_lookups'] = num_lookups
-        cover = book['asin'] + ".jpg"
-        book['cover'] = url_for('static', filename=f"covers/{cover}")  
+        book['cover'] = url_for('book_cover', asin=book['asin'])
         book['num_decks'] = has_decks4asin(db, book['asin']) 
         return book
     except Exception as e:
@@ -299,7 +557,8 @@ def get_usage(db, book_id): # retrieve text passages with looked-up words from k
 
 def write_history_entry(db, user_id, deck_id, dict_id, authors, title, lang, timestamp, logger):
     #write_history_entry(db, user_id, deck_id, book['authors'], book['title'], book['num_lookups'], timestamp, logger)
-    """ write an entry into the history table"""
+    """ write an entry into the history table
+    :return: True, or False if it could not be written (callers report it)"""
     try:
         db.execute("""
         INSERT INTO history (user_id, deck_id, dict_id, authors, title, lang, timestamp)
@@ -307,9 +566,17 @@ def write_history_entry(db, user_id, deck_id, dict_id, authors, title, lang, tim
         """, user_id, deck_id, dict_id, authors, title, lang, timestamp)
         logger.info(f"wrote history entry for user {user_id}, deck {deck_id},")
     except Exception as e:
-        flash(f"❌ a database error occured while writing history entry: {e}", "error")
+        logger.error(f"failed to write history entry for user {user_id}, deck {deck_id}: {e}")
+        return False
+    return True
+
+HISTORY_PAGE_SIZE = 25
 
-def show_history(db):
+def show_history(db, lang=None, before=None, limit=HISTORY_PAGE_SIZE):
+    """ get one page of the user's history, latest entry per deck, newest first
+    :param lang:    optional language filter
+    :param before:  keyset cursor (timestamp, deck_id) of the last row of the previous page
+    :return:        (rows, cursor for the next page or None)"""
     user_id = session['user_id']
     query = """SELECT
             h.deck_id,
@@ -317,7 +584,7 @@ def show_history(db):
             h.authors,
             h.title,
             h.lang,
-            MAX(h.timestamp) AS timestamp,
+            h.timestamp,
             d.deckname,
             d.cards,
             d.file_exists
@@ -325,14 +592,30 @@ def show_history(db):
             JOIN decks d
             ON d.id = h.deck_id
             WHERE h.user_id = ?
-            GROUP BY h.deck_id
-            ORDER BY h.timestamp DESC"""
+            AND h.id = (SELECT h2.id FROM history h2
+                        WHERE h2.deck_id = h.deck_id
+                        ORDER BY h2.timestamp DESC, h2.id DESC LIMIT 1)"""
+    args = [user_id]
+    if lang:
+        query += " AND h.lang = ?"
+        args.append(lang)
+    if before:
+        query += " AND (h.timestamp, h.deck_id) < (?, ?)"
+        args.extend(before)
+    # fetch one extra row to find out whether there is a next page
+    query += " ORDER BY h.timestamp DESC, h.deck_id DESC LIMIT ?"
+    args.append(limit + 1)
     try:
-        result = db.execute(query, user_id)
+        result = db.execute(query, *args)
     except Exception as e:
-        flash(f"❌ a database error occured while writing history entry: {e}", "error")
+        flash(f"❌ a database error occured while reading history: {e}", "error")
+        return [], None
 
-    return result
+    if len(result) > limit:
+        result = result[:limit]
+        last = result[-1]
+        return result, (last['timestamp'], last['deck_id'])
+    return result, None
 
 def has_history(db):
    user_id = session['user_id'] 
@@ -340,6 +623,24 @@ def has_history(db):
    result = db.execute(query, user_id)
    return result is not None
 
+def count_decks(db, user_id):
+    """ number of the user's decks whose files exist"""
+    result = db.execute("SELECT COUNT(*) AS num_decks FROM decks WHERE user_id = ? AND file_exists = 1", user_id)
+    return result[0]["num_decks"]
+
+def get_decknames(db, user_id, asin=None):
+    """ file names of the user's existing decks (for one book if asin is given)"""
+    if asin is None:
+        rows = db.execute("SELECT deckname FROM decks WHERE user_id = ? AND file_exists = 1", user_id)
+    else:
+        rows = db.execute(
+            "SELECT deckname FROM decks WHERE user_id = ? AND file_exists = 1 AND asin = ?", user_id, asin)
+    return [row['deckname'] for row in rows]
+
+def get_linked_decks(db):
+    """ id, user_id and deckname of all decks whose files should exist"""
+    return db.execute("SELECT id, user_id, deckname FROM decks WHERE file_exists = 1")
+
 def has_decks4asin(db, asin):
     user_id = session['user_id']
     query = """
@@ -350,8 +651,10 @@ def has_decks4asin(db, asin):
     result = db.execute(query, user_id, asin)
     return result[0]["num_decks"]
 
-def get_deck_by_id(db, deck_id, logger):
-    user_id = session['user_id']
+def get_deck_by_id(db, deck_id, logger, user_id=None):
+    """ deck of the (logged in) user with its history info, or None"""
+    if user_id is None:
+        user_id = session['user_id']
     deck_id = int(deck_id)
     query = """SELECT
                 h.dict_id,
@@ -370,3 +673,59 @@ def get_deck_by_id(db, deck_id, logger):
     except Exception as e:
         logger.error(f"get_deck_by_id: a database error occured retrieving deck info for deck_id {deck_id}: {e}")
         return None
+
+# JSON API: access tokens (only their sha256 is stored)
+def create_api_token(db, user_id):
+    """ create a new API token for the user
+    :return: the token (it cannot be retrieved again)"""
+    token = secrets.token_urlsafe(32)
+    db.execute("INSERT INTO api_tokens (token_hash, user_id, created_at) VALUES (?, ?, ?)",
+               hashlib.sha256(token.encode()).hexdigest(), user_id, int(time.time()))
+    return token
+
+def get_token_user(db, token):
+    """ id of the user an API token belongs to, or None"""
+    rows = db.execute("SELECT user_id FROM api_tokens WHERE token_hash = ?", hashlib.sha256(token.encode()).hexdigest())
+    return rows[0]['user_id'] if rows else None
+
+def revoke_api_tokens(db, user_id):
+    """ delete all API tokens of the user, return how many there were"""
+    return db.execute("DELETE FROM api_tokens WHERE user_id = ?", user_id)
+
+# JSON API: background deck builds
+def insert_deck_job(db, user_id, book_id, dict_id, card_type):
+    now = int(time.time())
+    return db.execute("""
+        INSERT INTO deck_jobs (user_id, book_id, dict_id, card_type, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)""", user_id, book_id, dict_id, card_type, now, now)
+
+def update_deck_job(db, job_id, status, message=None, deck_id=None, cards=None):
+    db.execute("""
+        UPDATE deck_jobs SET status = ?, message = ?, deck_id = ?, cards = ?, updated_at = ?
+        WHERE id = ?""", status, message, deck_id, cards, int(time.time()), job_id)
+
+def get_deck_job(db, user_id, job_id):
+    rows = db.execute("SELECT * FROM deck_jobs WHERE user_id = ? AND id = ?", user_id, job_id)
+    return rows[0] if rows else None
+
+def get_deck_jobs(db, user_id, limit=50):
+    return db.execute("SELECT * FROM deck_jobs WHERE user_id = ? ORDER BY id DESC LIMIT ?", user_id, limit)
+
+# languages decks can be made for (as in get_books_from_vocabdb)
+SUPPORTED_VOCAB_LANGS = ['en', 'de', 'fr', 'es', 'pt']
+
+def list_vocabdb_books(db, vdb, user_id, lang=None):
+    """ books of a user's vocab db with their number of looked up words and existing decks
+    (like get_books_from_vocabdb, without session, flash messages and cover urls)"""
+    query = """
+        SELECT b.id, b.lang, b.asin, b.title, b.authors, COUNT(DISTINCT l.word_key) AS num_lookups
+        FROM BOOK_INFO b JOIN LOOKUPS l ON l.book_key = b.id
+        WHERE b.lang IN (?)
+        GROUP BY b.id
+        ORDER BY b.lang, b.authors, b.title"""
+    books = vdb.execute(query, [lang] if lang else SUPPORTED_VOCAB_LANGS)
+    num_decks = {row['asin']: row['num_decks'] for row in db.execute(
+        "SELECT asin, COUNT(*) AS num_decks FROM decks WHERE user_id = ? AND file_exists = 1 GROUP BY asin", user_id)}
+    for book in books:
+        book['num_decks'] = num_decks.get(book['asin'], 0)
+    return books
@@ -1,4 +1,5 @@
 import requests
+import asyncio
 import hashlib
 import os
 from pathlib import Path
@@ -6,13 +7,89 @@ from typing import Optional, Tuple
 import time
 import io
 from requests.exceptions import RequestException
+from requests.adapters import HTTPAdapter
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import threading
 import logging
 from dataclasses import dataclass
 from typing import Optional, Dict, Any
+from cover_store import CoverStore, get_cover_store
 
 # Setup logging (always needed)
 logger = logging.getLogger(__name__)
 
+# size of the connection pool of the shared fetcher's session (per host)
+COVER_POOL_SIZE = 16
+# number of rendered placeholder images kept in memory
+PLACEHOLDER_CACHE_SIZE = 256
+
+# resized cover variants (max width, height) and formats (extension: PIL format) served to templates
+COVER_VARIANTS = {"thumb": (150, 200), "detail": (300, 400)}
+COVER_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+# seconds a book for which no source had a cover is not looked up again
+NEGATIVE_CACHE_TTL = 7 * 24 * 60 * 60
+
+# hedged source racing: seconds before the next source is started while the previous
+# one is still running, and seconds a successful lower priority source waits for
+# higher priority sources still running
+HEDGE_DELAY = 0.5
+PRIORITY_WINDOW = 0.3
+
+# separate pools for racing sources and the URL patterns raced within a source,
+# so a source never waits for pattern fetches queued behind other sources
+_source_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="cover-source")
+_pattern_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="cover-pattern")
+
+# smallest real cover (bytes) per source, smaller images are the source's "no cover" placeholder
+MIN_COVER_BYTES = {"openlibrary": 5000, "amazon": 10000}
+DEFAULT_MIN_COVER_BYTES = 1000
+
+def is_cover_response(response, source=None) -> bool:
+    """Whether a 200 response looks like a real cover: an image, and not one of the source's placeholders."""
+    content_type = response.headers.get('content-type', '')
+    min_bytes = MIN_COVER_BYTES.get(source, DEFAULT_MIN_COVER_BYTES)
+    return response.status_code == 200 and content_type.startswith('image/') and len(response.content) >= min_bytes
+
+def validators(response) -> Dict[str, Optional[str]]:
+    """HTTP cache validators of a response (used for conditional revalidation)."""
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+# Cover sources and lookups are written as generators of the steps below, so the same code runs
+# with the blocking session (BookCoverFetcher._run) and in the event loop (_run_async)
+@dataclass
+class Get:
+    """HTTP GET step: the driver sends back the response or throws the request's exception in."""
+    url: str
+    timeout: float = 10
+    headers: Optional[Dict[str, str]] = None
+
+@dataclass
+class Race:
+    """Race step: the driver races the step generators made by `calls` (see _race) and sends back the winner."""
+    calls: list
+    executor: ThreadPoolExecutor   # only used by the blocking driver
+    hedge_delay: Optional[float] = None
+    window: Optional[float] = None
+
+class AsyncResponse:
+    """An httpx response that raises requests' HTTPError, so sources handle both drivers' responses alike."""
+    def __init__(self, response):
+        self._response = response
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def raise_for_status(self):
+        if self._response.is_error:
+            raise requests.exceptions.HTTPError(f"{self._response.status_code} error for url: {self._response.url}", response=self)
+
 @dataclass
 class CoverResult:
    """Structured result for book cover fetches."""
@@ -29,6 +106,11 @@ class CoverResult:
    def success(self) -> bool:
        """Check if a cover was successfully fetched."""
        return self.image_bytes is not None and len(self.image_bytes) > 0
+
+   @property
+   def is_placeholder(self) -> bool:
+       """Check if the image is a generated placeholder rather than a real cover."""
+       return bool(self.metadata.get("is_placeholder"))
    
    def to_dict(self) -> Dict[str, Any]:
        """Convert to dictionary for serialization."""
@@ -40,26 +122,161 @@ class CoverResult:
            "metadata": self.metadata or {}
        } 
 
+@lru_cache(maxsize=1)
+def load_placeholder_font():
+    """Load the placeholder font once - tries common font paths, falls back to PIL's default."""
+    from PIL import ImageFont
+    try:
+        # Try common font paths
+        font_paths = [
+            "/System/Library/Fonts/Helvetica.ttc",  # macOS
+            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # Linux
+            "C:/Windows/Fonts/arial.ttf",  # Windows
+        ]
+        
+        for path in font_paths:
+            try:
+                return ImageFont.truetype(path, size=24)
+            except:
+                continue
+    except:
+        pass
+    return ImageFont.load_default()
+
+@lru_cache(maxsize=PLACEHOLDER_CACHE_SIZE)
+def render_placeholder(title=None, author=None, size="S"):
+    """
+    Generate a proper placeholder image with text.
+    
+    Args:
+        title: Book title to display
+        author: Book author to display  
+        size: Image size - determines dimensions
+    
+    Returns:
+        bytes of a valid JPEG/PNG image
+    """
+    try:
+        # Import PIL locally since it's optional
+        from PIL import Image, ImageDraw
+        import io
+        
+        # Set dimensions based on size
+        size_map = {"S": (150, 200), "M": (300, 400), "L": (600, 800)}
+        width, height = size_map.get(size, (300, 400))
+        
+        # Create image with a neutral background
+        img = Image.new('RGB', (width, height), color=(240, 240, 240))
+        draw = ImageDraw.Draw(img)
+        
+        # Add a subtle border
+        draw.rectangle([0, 0, width-1, height-1], outline=(200, 200, 200), width=2)
+        
+        # font is loaded once per process
+        font = load_placeholder_font()
+        
+        # Prepare text
+        display_text = []
+        if title:
+            # Truncate long titles
+            short_title = title[:30] + "..." if len(title) > 30 else title
+            display_text.append(short_title)
+        
+        if author:
+            short_author = author[:30] + "..." if len(author) > 30 else author
+            display_text.append(f"by {short_author}")
+        
+        if not display_text:
+            display_text = ["No Cover", "Available"]
+        
+        # Draw text with word wrapping
+        y_position = height // 3
+        line_height = 35
+        
+        for line in display_text:
+            # Simple word wrapping
+            words = line.split()
+            lines = []
+            current_line = []
+            
+            for word in words:
+                current_line.append(word)
+                test_line = ' '.join(current_line)
+                # Rough estimate of text width
+                if len(test_line) * 12 > width * 0.8:  # 80% of image width
+                    lines.append(' '.join(current_line[:-1]))
+                    current_line = [word]
+            
+            if current_line:
+                lines.append(' '.join(current_line))
+            
+            # Draw each wrapped line
+            for wrapped_line in lines:
+                # Calculate text position (centered)
+                try:
+                    bbox = draw.textbbox((0, 0), wrapped_line, font=font)
+                    text_width = bbox[2] - bbox[0]
+                    text_height = bbox[3] - bbox[1]
+                except:
+                    # Fallback for old PIL versions
+                    text_width = len(wrapped_line) * 12
+                    text_height = 24
+                
+                x = (width - text_width) // 2
+                y = y_position
+                
+                # Draw text with shadow for readability
+                draw.text((x+1, y+1), wrapped_line, font=font, fill=(180, 180, 180))
+                draw.text((x, y), wrapped_line, font=font, fill=(80, 80, 80))
+                
+                y_position += line_height
+        
+        # Add "No Cover Available" at bottom
+        footer = "No Cover Available"
+        try:
+            bbox = draw.textbbox((0, 0), footer, font=font)
+            footer_width = bbox[2] - bbox[0]
+        except:
+            footer_width = len(footer) * 12
+        
+        footer_x = (width - footer_width) // 2
+        footer_y = height - 50
+        draw.text((footer_x, footer_y), footer, font=font, fill=(150, 150, 150))
+        
+        # Convert to bytes
+        img_bytes = io.BytesIO()
+        img.save(img_bytes, format='JPEG', quality=85)
+        return img_bytes.getvalue()
+        
+    except Exception as e:
+        # Ultimate fallback: tiny valid JPEG
+        print(f"Placeholder generation failed: {e}")
+        return b'\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00\xff\xdb\x00C\x00\x08\x06\x06\x07\x06\x05\x08\x07\x07\x07\t\t\x08\n\x0c\x14\r\x0c\x0b\x0b\x0c\x19\x12\x13\x0f\x14\x1d\x1a\x1f\x1e\x1d\x1a\x1c\x1c $.\' ",#\x1c\x1c(7),01444\x1f\'9=82<.342\xff\xc0\x00\x0b\x08\x00\x01\x00\x01\x01\x01\x11\x00\xff\xc4\x00\x1f\x00\x00\x01\x05\x01\x01\x01\x01\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\xff\xc4\x00\xb5\x10\x00\x02\x01\x03\x03\x02\x04\x03\x05\x05\x04\x04\x00\x00\x01}\x01\x02\x03\x00\x04\x11\x05\x12!1A\x06\x13Qa\x07"q\x142\x81\x91\xa1\x08#B\xb1\xc1\x15R\xd1\xf0$3br\x82\t\n\x16\x17\x18\x19\x1a%&\'()*456789:CDEFGHIJSTUVWXYZcdefghijstuvwxyz\x83\x84\x85\x86\x87\x88\x89\x8a\x92\x93\x94\x95\x96\x97\x98\x99\x9a\xa2\xa3\xa4\xa5\xa6\xa7\xa8\xa9\xaa\xb2\xb3\xb4\xb5\xb6\xb7\xb8\xb9\xba\xc2\xc3\xc4\xc5\xc6\xc7\xc8\xc9\xca\xd2\xd3\xd4\xd5\xd6\xd7\xd8\xd9\xda\xe1\xe2\xe3\xe4\xe5\xe6\xe7\xe8\xe9\xea\xf1\xf2\xf3\xf4\xf5\xf6\xf7\xf8\xf9\xfa\xff\xda\x00\x08\x01\x01\x00\x00?\x00\xec\xe8\xa2\x8a\xff\xd9'
+
 class BookCoverFetcher:
     """
     Fetch book covers from multiple sources with caching.
     """
     
-    def __init__(self, cache_dir: str = "./covers", user_agent: str = None):
+    def __init__(self, cache_dir: str = None, user_agent: str = None):
         """
-        Initialize the fetcher with cache directory.
+        Initialize the fetcher with its cover store.
         
         Args:
-            cache_dir: Directory to cache downloaded covers
+            cache_dir: Directory of a separate cover store (default: the shared store)
             user_agent: Custom User-Agent for requests
         """
-        self.cache_dir = Path(cache_dir)
-        self.cache_dir.mkdir(exist_ok=True)
+        self.store = get_cover_store() if cache_dir is None else CoverStore(cache_dir)
+        self.cache_dir = self.store.root
         
         self.user_agent = user_agent or (
             "Mozilla/5.0 (compatible; Kindle2AnkiApp/1.0; +http://yourdomain.com)"
         )
+        # pooled keep-alive session, shared by all threads fetching covers
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=COVER_POOL_SIZE, pool_maxsize=COVER_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
         self.session.headers.update({"User-Agent": self.user_agent})
         
         # Priority of sources (highest first)
@@ -68,33 +285,6 @@ class BookCoverFetcher:
             self._fetch_google_books,
             self._fetch_amazon_direct
         ]
-    
-
-        def _check_cache(self, isbn, title, author, size) -> CoverResult:
-            """Check cache - returns CoverResult."""
-            cache_key = self._create_cache_key(isbn, title, author, size)
-            cache_file = self.cache_dir / f"{cache_key}.jpg"
-            
-            if not cache_file.exists():
-                return CoverResult(None, "cache", "", {"cache_hit": False})
-            
-            try:
-                with open(cache_file, "rb") as f:
-                    image_bytes = f.read()
-                
-                return CoverResult(
-                    image_bytes,
-                    "cache",
-                    f"file://{cache_file}",
-                    {
-                        "cache_hit": True,
-                        "cache_key": cache_key,
-                        "size_bytes": len(image_bytes),
-                        "cached_at": cache_file.stat().st_mtime
-                    }
-                )
-            except Exception as e:
-                return CoverResult(None, "cache", "", {"error": str(e), "cache_hit": False})
 
     def get_cover(
         self, 
@@ -102,7 +292,8 @@ class BookCoverFetcher:
         title: str = None, 
         author: str = None,
         size: str = "M",
-        use_cache: bool = True
+        use_cache: bool = True,
+        race: bool = True
         ) -> CoverResult:
         """
         Get book cover image from best available source.
@@ -113,10 +304,15 @@ class BookCoverFetcher:
             author: Book author
             size: Image size - 'S' (small), 'M' (medium), 'L' (large)
             use_cache: Use cached image if available
+            race: Query sources concurrently (hedged, see _race) instead of one after another
             
         Returns:
             CoverResult object with image bytes and metadata
         """
+        return self._run(self._cover_steps(isbn, title, author, size, use_cache, race))
+    
+    def _cover_steps(self, isbn, title, author, size, use_cache=True, race=True):
+        """Steps of get_cover (a generator of Get / Race steps returning the CoverResult)."""
         # 1. Check cache (returns CoverResult)
         if use_cache:
             cache_result = self._check_cache(isbn, title, author, size)
@@ -125,12 +321,22 @@ class BookCoverFetcher:
                 return cache_result
         
         # 2. Try sources (all return CoverResult)
-        for source_func in self.sources:
-            result = source_func(isbn, title, author, size)
-            if result.success:
-                # Cache the successful result
+        if race:
+            calls = [
+                lambda source_func=source_func: source_func(isbn, title, author, size)
+                for source_func in self.sources
+            ]
+            result = yield Race(calls, _source_executor)
+            if result is not None:
                 self._save_to_cache(result, isbn, title, author, size)
                 return result
+        else:
+            for source_func in self.sources:
+                result = yield from source_func(isbn, title, author, size)
+                if result.success:
+                    # Cache the successful result
+                    self._save_to_cache(result, isbn, title, author, size)
+                    return result
         
         # 3. Fallback placeholder (returns CoverResult)
         placeholder_bytes = self._get_placeholder(title, author, size)
@@ -147,20 +353,235 @@ class BookCoverFetcher:
             }
         )
     
+    def revalidate(self, url, etag=None, last_modified=None, source=None) -> CoverResult:
+        """
+        Conditional GET of a previously fetched cover URL (source is the one it came from,
+        a changed image has to pass the same checks as that source's fetch).
+        
+        Returns:
+            CoverResult with metadata "not_modified" True (and no bytes) on 304,
+            the new image on 200, or a failed result on errors and on anything
+            that is not a real cover (error pages, placeholders)
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        try:
+            response = self.session.get(url, timeout=8, headers=headers)
+        except RequestException as e:
+            return CoverResult(None, "revalidate", url, {"error": type(e).__name__, "message": str(e)})
+        
+        if response.status_code == 304:
+            return CoverResult(None, "revalidate", url, {"not_modified": True, **validators(response)})
+        if response.status_code != 200 or not response.content:
+            return CoverResult(None, "revalidate", url, {"error": "http_error", "status_code": response.status_code})
+        if not is_cover_response(response, source):
+            return CoverResult(None, "revalidate", url, {
+                "error": "invalid_image",
+                "content_type": response.headers.get('content-type', ''),
+                "size_bytes": len(response.content)
+            })
+        return CoverResult(
+            image_bytes=response.content,
+            source="revalidate",
+            url=url,
+            metadata={
+                "not_modified": False,
+                "size_bytes": len(response.content),
+                "content_type": response.headers.get('content-type', 'image/jpeg'),
+                "fetched_at": time.time(),
+                **validators(response)
+            }
+        )
+    
+    def _race(self, calls, executor, hedge_delay=None, window=None) -> Optional[CoverResult]:
+        """
+        Race fetch calls (in priority order, highest first) against each other.
+        
+        Each call is started hedge_delay seconds after the previous one, or right
+        away once all running calls have failed. When a call succeeds while higher
+        priority calls are still running, those get `window` seconds to succeed as
+        well before the best result is taken (no further calls are started meanwhile,
+        they could not beat the winner). Calls not yet started are cancelled;
+        running ones are left to finish in the background and their results ignored.
+        
+        Returns:
+            the successful CoverResult of highest priority, or None if all failed
+        """
+        hedge_delay = HEDGE_DELAY if hedge_delay is None else hedge_delay
+        window = PRIORITY_WINDOW if window is None else window
+        
+        def guarded(call):
+            try:
+                return call()
+            except Exception as e:
+                return CoverResult(None, "race", "", {"error": "exception", "exception": type(e).__name__, "message": str(e)})
+        
+        futures = []
+        last_launch = 0.0
+        window_ends = None
+        while True:
+            now = time.monotonic()
+            
+            # best success so far and whether all higher priority calls are settled
+            winner = None
+            for i, future in enumerate(futures):
+                if future.done() and future.result().success:
+                    winner = i
+                    break
+            if winner is not None:
+                higher_pending = any(not f.done() for f in futures[:winner])
+                if window_ends is None:
+                    window_ends = now + window
+                if not higher_pending or now >= window_ends:
+                    for future in futures[winner + 1:]:
+                        future.cancel()
+                    return futures[winner].result()
+            # nothing new is started once a call has succeeded (window_ends is set),
+            # calls of lower priority than the winner could never be taken
+            elif len(futures) < len(calls) and (
+                now - last_launch >= hedge_delay or all(f.done() for f in futures)
+            ):
+                futures.append(executor.submit(guarded, calls[len(futures)]))
+                last_launch = now
+                continue
+            elif all(f.done() for f in futures):
+                return None
+            
+            # sleep until a call completes, the next hedge is due or the window closes
+            timeouts = []
+            if window_ends is None and len(futures) < len(calls):
+                timeouts.append(last_launch + hedge_delay - now)
+            if window_ends is not None:
+                timeouts.append(window_ends - now)
+            pending = [f for f in futures if not f.done()]
+            wait(pending, timeout=max(0.0, min(timeouts)) if timeouts else None, return_when=FIRST_COMPLETED)
+
+    async def _race_async(self, calls, hedge_delay=None, window=None) -> Optional[CoverResult]:
+        """
+        _race for coroutine functions, in the running event loop. Same hedging and
+        priority window, but calls that are no longer needed are cancelled.
+        """
+        hedge_delay = HEDGE_DELAY if hedge_delay is None else hedge_delay
+        window = PRIORITY_WINDOW if window is None else window
+        loop = asyncio.get_running_loop()
+
+        async def guarded(call):
+            try:
+                return await call()
+            except Exception as e:
+                return CoverResult(None, "race", "", {"error": "exception", "exception": type(e).__name__, "message": str(e)})
+
+        tasks = []
+        last_launch = 0.0
+        window_ends = None
+        try:
+            while True:
+                now = loop.time()
+
+                winner = None
+                for i, task in enumerate(tasks):
+                    if task.done() and task.result().success:
+                        winner = i
+                        break
+                if winner is not None:
+                    higher_pending = any(not t.done() for t in tasks[:winner])
+                    if window_ends is None:
+                        window_ends = now + window
+                    if not higher_pending or now >= window_ends:
+                        return tasks[winner].result()
+                elif len(tasks) < len(calls) and (
+                    now - last_launch >= hedge_delay or all(t.done() for t in tasks)
+                ):
+                    tasks.append(asyncio.ensure_future(guarded(calls[len(tasks)])))
+                    last_launch = now
+                    continue
+                elif all(t.done() for t in tasks):
+                    return None
+
+                timeouts = []
+                if window_ends is None and len(tasks) < len(calls):
+                    timeouts.append(last_launch + hedge_delay - now)
+                if window_ends is not None:
+                    timeouts.append(window_ends - now)
+                pending = [t for t in tasks if not t.done()]
+                await asyncio.wait(pending, timeout=max(0.0, min(timeouts)) if timeouts else None, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _run(self, steps):
+        """
+        Run a generator of Get / Race steps with the blocking session (Race steps on
+        their executor, see _race).
+
+        Returns:
+            the generator's return value
+        """
+        try:
+            step = next(steps)
+            while True:
+                try:
+                    if isinstance(step, Race):
+                        calls = [lambda call=call: self._run(call()) for call in step.calls]
+                        outcome = self._race(calls, step.executor, step.hedge_delay, step.window)
+                    else:
+                        outcome = self.session.get(step.url, timeout=step.timeout, headers=step.headers)
+                except Exception as e:
+                    step = steps.throw(e)
+                else:
+                    step = steps.send(outcome)
+        except StopIteration as stop:
+            return stop.value
+
+    async def _run_async(self, client, steps):
+        """
+        Run a generator of Get / Race steps in the event loop with an httpx.AsyncClient.
+        httpx timeouts and transport errors are thrown in as their requests counterparts,
+        so sources handle them like with the blocking session.
+
+        Returns:
+            the generator's return value
+        """
+        import httpx
+        try:
+            step = next(steps)
+            while True:
+                try:
+                    if isinstance(step, Race):
+                        calls = [lambda call=call: self._run_async(client, call()) for call in step.calls]
+                        outcome = await self._race_async(calls, step.hedge_delay, step.window)
+                    else:
+                        outcome = AsyncResponse(await client.get(step.url, timeout=step.timeout, headers=step.headers))
+                except httpx.TimeoutException as e:
+                    step = steps.throw(requests.exceptions.Timeout(str(e)))
+                except httpx.HTTPError as e:
+                    step = steps.throw(requests.exceptions.ConnectionError(str(e)))
+                except Exception as e:
+                    step = steps.throw(e)
+                else:
+                    step = steps.send(outcome)
+        except StopIteration as stop:
+            return stop.value
+
     def _save_to_cache(self, result, isbn, title, author, size):
-        """Save successful result to cache."""
-        print("Caching cover")
+        """Save successful result to the cover store."""
         if not result.success:
             return
         
         cache_key = self._create_cache_key(isbn, title, author, size)
-        cache_file = self.cache_dir / f"{cache_key}.jpg"
         
         try:
-            with open(cache_file, "wb") as f:
-                f.write(result.image_bytes)
+            self.store.put(
+                cache_key,
+                result.image_bytes,
+                result.metadata.get("content_type", "image/jpeg"),
+                meta=result_meta(result)
+            )
         except Exception as e:
-            print(f"Failed to cache: {e}")
+            logger.error(f"Failed to cache: {e}")
     
     def _create_cache_key(self, isbn, title, author, size):
         key_str = f"{isbn or ''}_{title or ''}_{author or ''}_{size}"
@@ -168,7 +589,7 @@ class BookCoverFetcher:
     
     def _check_cache(self, isbn, title, author, size) -> CoverResult:
         """
-        Check if cover is in cache - returns CoverResult.
+        Check if cover is in the cover store - returns CoverResult.
         
         Args:
             isbn: ISBN of the book
@@ -179,72 +600,39 @@ class BookCoverFetcher:
         Returns:
             CoverResult object (successful if found in cache, failed otherwise)
         """
-        print("Checking cache...")
+        cache_key = self._create_cache_key(isbn, title, author, size)
         try:
-            # Generate cache filename
-            cache_file = self._get_cache_filename(isbn, title, author, size)
+            image_bytes = self.store.read(cache_key)
             
-            # Check if file exists
-            if not cache_file.exists():
+            if not image_bytes:
                 return CoverResult(
                     image_bytes=None,
                     source="cache",
                     url="",
                     metadata={
                         "cache_hit": False,
-                        "cache_file": str(cache_file),
-                        "reason": "File does not exist",
+                        "cache_key": cache_key,
+                        "reason": "Not in cover store",
                         "isbn": isbn,
                         "title": title
                     }
                 )
             
-            # Check file size (empty cache files shouldn't happen, but guard against it)
-            file_size = cache_file.stat().st_size
-            if file_size == 0:
-                # Remove corrupted cache file
-                cache_file.unlink(missing_ok=True)
-                return CoverResult(
-                    image_bytes=None,
-                    source="cache",
-                    url="",
-                    metadata={
-                        "cache_hit": False,
-                        "cache_file": str(cache_file),
-                        "reason": "Empty file removed",
-                        "isbn": isbn
-                    }
-                )
-            
-            # Read the cached image
-            with open(cache_file, "rb") as f:
-                image_bytes = f.read()
-            
-            # Verify we actually read something
-            if not image_bytes:
-                return CoverResult(
-                    image_bytes=None,
-                    source="cache",
-                    url="",
-                    metadata={
-                        "cache_hit": False,
-                        "cache_file": str(cache_file),
-                        "reason": "Read empty bytes",
-                        "isbn": isbn
-                    }
-                )
-            
-            # Success - cached cover found
+            # Success - cached cover found (origin and validators are kept for revalidation)
+            meta = self.store.meta(cache_key) or {}
             return CoverResult(
                 image_bytes=image_bytes,
                 source="cache",
-                url=f"file://{cache_file.absolute()}",
+                url=f"cache://{cache_key}",
                 metadata={
                     "cache_hit": True,
-                    "cache_file": str(cache_file),
+                    "cache_key": cache_key,
+                    "origin": meta.get("source"),
+                    "origin_url": meta.get("url"),
+                    "etag": meta.get("etag"),
+                    "last_modified": meta.get("last_modified"),
+                    "content_type": meta.get("mime", "image/jpeg"),
                     "size_bytes": len(image_bytes),
-                    "file_size": file_size,
-                    "cached_at": cache_file.stat().st_mtime,
                     "isbn": isbn,
                     "title": title,
                     "author": author,
@@ -252,21 +640,6 @@ class BookCoverFetcher:
                 }
             )
             
-        except PermissionError as e:
-            return CoverResult(
-                image_bytes=None,
-                source="cache", 
-                url="",
-                metadata={
-                    "cache_hit": False,
-                    "error": "permission_error",
-                    "exception": type(e).__name__,
-                    "message": str(e),
-                    "isbn": isbn,
-                    "reason": f"Cannot read cache file: {e}"
-                }
-            )
-            
         except Exception as e:
             return CoverResult(
                 image_bytes=None,
@@ -282,138 +655,25 @@ class BookCoverFetcher:
                 }
             )
 
-    def _get_cache_filename(self, isbn, title, author, size):
-        """Should return a hash-based filename."""
-        cache_key = self._create_cache_key(isbn, title, author, size)
-        return self.cache_dir / f"{cache_key}.jpg"  # Should be just the hash!
+    def _check_negative_cache(self, asin, title, author, size) -> bool:
+        """Check if all sources failed for this book less than NEGATIVE_CACHE_TTL seconds ago."""
+        age = self.store.miss_age(self._create_cache_key(asin, title, author, size))
+        return age is not None and age < NEGATIVE_CACHE_TTL
 
-    def _get_placeholder(self, title=None, author=None, size="S"):
-        """
-        Generate a proper placeholder image with text.
-        
-        Args:
-            title: Book title to display
-            author: Book author to display  
-            size: Image size - determines dimensions
-        
-        Returns:
-            bytes of a valid JPEG/PNG image
-        """
+    def _save_negative_cache(self, asin, title, author, size):
+        """Record that all sources failed for this book."""
         try:
-            # Import PIL locally since it's optional
-            from PIL import Image, ImageDraw, ImageFont
-            import io
-            
-            # Set dimensions based on size
-            size_map = {"S": (150, 200), "M": (300, 400), "L": (600, 800)}
-            width, height = size_map.get(size, (300, 400))
-            
-            # Create image with a neutral background
-            img = Image.new('RGB', (width, height), color=(240, 240, 240))
-            draw = ImageDraw.Draw(img)
-            
-            # Add a subtle border
-            draw.rectangle([0, 0, width-1, height-1], outline=(200, 200, 200), width=2)
-            
-            # Try to load a font, fallback to default
-            try:
-                # Try common font paths
-                font_paths = [
-                    "/System/Library/Fonts/Helvetica.ttc",  # macOS
-                    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # Linux
-                    "C:/Windows/Fonts/arial.ttf",  # Windows
-                ]
-                
-                font = None
-                for path in font_paths:
-                    try:
-                        font = ImageFont.truetype(path, size=24)
-                        break
-                    except:
-                        continue
-                
-                if font is None:
-                    font = ImageFont.load_default()
-            except:
-                font = ImageFont.load_default()
-            
-            # Prepare text
-            display_text = []
-            if title:
-                # Truncate long titles
-                short_title = title[:30] + "..." if len(title) > 30 else title
-                display_text.append(short_title)
-            
-            if author:
-                short_author = author[:30] + "..." if len(author) > 30 else author
-                display_text.append(f"by {short_author}")
-            
-            if not display_text:
-                display_text = ["No Cover", "Available"]
-            
-            # Draw text with word wrapping
-            y_position = height // 3
-            line_height = 35
-            
-            for line in display_text:
-                # Simple word wrapping
-                words = line.split()
-                lines = []
-                current_line = []
-                
-                for word in words:
-                    current_line.append(word)
-                    test_line = ' '.join(current_line)
-                    # Rough estimate of text width
-                    if len(test_line) * 12 > width * 0.8:  # 80% of image width
-                        lines.append(' '.join(current_line[:-1]))
-                        current_line = [word]
-                
-                if current_line:
-                    lines.append(' '.join(current_line))
-                
-                # Draw each wrapped line
-                for wrapped_line in lines:
-                    # Calculate text position (centered)
-                    try:
-                        bbox = draw.textbbox((0, 0), wrapped_line, font=font)
-                        text_width = bbox[2] - bbox[0]
-                        text_height = bbox[3] - bbox[1]
-                    except:
-                        # Fallback for old PIL versions
-                        text_width = len(wrapped_line) * 12
-                        text_height = 24
-                    
-                    x = (width - text_width) // 2
-                    y = y_position
-                    
-                    # Draw text with shadow for readability
-                    draw.text((x+1, y+1), wrapped_line, font=font, fill=(180, 180, 180))
-                    draw.text((x, y), wrapped_line, font=font, fill=(80, 80, 80))
-                    
-                    y_position += line_height
-            
-            # Add "No Cover Available" at bottom
-            footer = "No Cover Available"
-            try:
-                bbox = draw.textbbox((0, 0), footer, font=font)
-                footer_width = bbox[2] - bbox[0]
-            except:
-                footer_width = len(footer) * 12
-            
-            footer_x = (width - footer_width) // 2
-            footer_y = height - 50
-            draw.text((footer_x, footer_y), footer, font=font, fill=(150, 150, 150))
-            
-            # Convert to bytes
-            img_bytes = io.BytesIO()
-            img.save(img_bytes, format='JPEG', quality=85)
-            return img_bytes.getvalue()
-            
+            self.store.record_miss(self._create_cache_key(asin, title, author, size))
         except Exception as e:
-            # Ultimate fallback: tiny valid JPEG
-            print(f"Placeholder generation failed: {e}")
-            return b'\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00\xff\xdb\x00C\x00\x08\x06\x06\x07\x06\x05\x08\x07\x07\x07\t\t\x08\n\x0c\x14\r\x0c\x0b\x0b\x0c\x19\x12\x13\x0f\x14\x1d\x1a\x1f\x1e\x1d\x1a\x1c\x1c $.\' ",#\x1c\x1c(7),01444\x1f\'9=82<.342\xff\xc0\x00\x0b\x08\x00\x01\x00\x01\x01\x01\x11\x00\xff\xc4\x00\x1f\x00\x00\x01\x05\x01\x01\x01\x01\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\xff\xc4\x00\xb5\x10\x00\x02\x01\x03\x03\x02\x04\x03\x05\x05\x04\x04\x00\x00\x01}\x01\x02\x03\x00\x04\x11\x05\x12!1A\x06\x13Qa\x07"q\x142\x81\x91\xa1\x08#B\xb1\xc1\x15R\xd1\xf0$3br\x82\t\n\x16\x17\x18\x19\x1a%&\'()*456789:CDEFGHIJSTUVWXYZcdefghijstuvwxyz\x83\x84\x85\x86\x87\x88\x89\x8a\x92\x93\x94\x95\x96\x97\x98\x99\x9a\xa2\xa3\xa4\xa5\xa6\xa7\xa8\xa9\xaa\xb2\xb3\xb4\xb5\xb6\xb7\xb8\xb9\xba\xc2\xc3\xc4\xc5\xc6\xc7\xc8\xc9\xca\xd2\xd3\xd4\xd5\xd6\xd7\xd8\xd9\xda\xe1\xe2\xe3\xe4\xe5\xe6\xe7\xe8\xe9\xea\xf1\xf2\xf3\xf4\xf5\xf6\xf7\xf8\xf9\xfa\xff\xda\x00\x08\x01\x01\x00\x00?\x00\xec\xe8\xa2\x8a\xff\xd9'
+            logger.error(f"Failed to save negative cache entry: {e}")
+
+    def clear_negative_cache(self, asin, title, author, size):
+        """Forget a negative cache entry, so the next fetch queries the sources again."""
+        self.store.clear_miss(self._create_cache_key(asin, title, author, size))
+
+    def _get_placeholder(self, title=None, author=None, size="S"):
+        """Placeholder image with title and author (rendered once per (title, author, size))."""
+        return render_placeholder(title, author, size)
     
     def _fetch_openlibrary(
         self, isbn, title, author, size
@@ -421,6 +681,7 @@ class BookCoverFetcher:
         """
         Fetch from Open Library Covers API.
         Highest quality for classic/known books.
+        Sources are step generators (see _run), returning a CoverResult.
         """
         if not isbn:
             return CoverResult(
@@ -433,11 +694,11 @@ class BookCoverFetcher:
         # Open Library API
         url = f"https://covers.openlibrary.org/b/isbn/{isbn}-{size}.jpg"
         
-        response = self.session.get(url, timeout=10)
+        response = yield Get(url, timeout=10)
         response.raise_for_status()
         
         # Check if it's not the default "no cover" image
-        if len(response.content) < 5000:  # Default image is small
+        if len(response.content) < MIN_COVER_BYTES["openlibrary"]:  # Default image is small
             return CoverResult(
                 image_bytes=None,
                 source="openlibrary",
@@ -459,7 +720,8 @@ class BookCoverFetcher:
                 "content_type": response.headers.get('content-type', 'image/jpeg'),
                 "isbn": isbn,
                 "status_code": response.status_code,
-                "fetched_at": time.time()
+                "fetched_at": time.time(),
+                **validators(response)
             }
         )
     
@@ -500,7 +762,7 @@ class BookCoverFetcher:
         
         try:
             # Make API request
-            response = self.session.get(api_url, timeout=10)
+            response = yield Get(api_url, timeout=10)
             response.raise_for_status()
             data = response.json()
             
@@ -543,7 +805,7 @@ class BookCoverFetcher:
                 )
             
             # Fetch the actual cover image
-            img_response = self.session.get(image_url, timeout=10)
+            img_response = yield Get(image_url, timeout=10)
             img_response.raise_for_status()
             
             # Success - return with rich metadata
@@ -562,6 +824,7 @@ class BookCoverFetcher:
                     "page_count": volume_info.get("pageCount"),
                     "categories": volume_info.get("categories", []),
                     "fetched_at": time.time(),
+                    **validators(img_response),
                     "api_url": api_url,
                     "image_size": google_size
                 }
@@ -627,70 +890,20 @@ class BookCoverFetcher:
                 }
             )
         
-        # Try multiple Amazon image URL patterns
+        # Try multiple Amazon image URL patterns (raced against each other, first listed preferred)
         url_patterns = [
             f"https://images-na.ssl-images-amazon.com/images/P/{isbn}.01._SCLZZZZZZZ_.jpg",
             f"https://m.media-amazon.com/images/P/{isbn}.01._SCLZZZZZZZ_.jpg",
             f"https://images.amazon.com/images/P/{isbn}.01._SCLZZZZZZZ_.jpg",
         ]
         
-        for url in url_patterns:
-            try:
-                response = self.session.get(url, timeout=8, headers={
-                    "User-Agent": self.user_agent,
-                    "Accept": "image/webp,image/apng,image/*,*/*;q=0.8",
-                    "Accept-Language": "en-US,en;q=0.9",
-                    "Referer": "https://www.amazon.com/"
-                })
-                
-                # Check if valid image (not placeholder/error)
-                if response.status_code == 200:
-                    content_length = len(response.content)
-                    content_type = response.headers.get('content-type', '')
-                    
-                    # Heuristic: valid book covers are usually > 10KB
-                    # Placeholder/error images are often smaller
-                    if content_length > 10000 and 'image' in content_type:
-                        return CoverResult(
-                            image_bytes=response.content,
-                            source="amazon",
-                            url=url,
-                            metadata={
-                                "size_bytes": content_length,
-                                "content_type": content_type,
-                                "isbn": isbn,
-                                "url_pattern": url_patterns.index(url) + 1,
-                                "status_code": response.status_code,
-                                "fetched_at": time.time(),
-                                "note": "Direct Amazon image fetch - check ToS compliance"
-                            }
-                        )
-                    else:
-                        # Image too small or wrong type - likely placeholder
-                        continue
-                        
-            except requests.exceptions.Timeout:
-                # Try next URL pattern
-                continue
-                
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code == 404:
-                    # This URL pattern doesn't work, try next
-                    continue
-                else:
-                    # Other HTTP error
-                    return CoverResult(
-                        image_bytes=None,
-                        source="amazon",
-                        url=url,
-                        metadata={
-                            "error": "http_error",
-                            "status_code": e.response.status_code if e.response else None,
-                            "isbn": isbn,
-                            "url_pattern": url_patterns.index(url) + 1,
-                            "exception": type(e).__name__
-                        }
-                    )
+        calls = [
+            lambda url=url, pattern=pattern: self._fetch_amazon_url(url, pattern, isbn)
+            for pattern, url in enumerate(url_patterns, start=1)
+        ]
+        result = yield Race(calls, _pattern_executor)
+        if result is not None:
+            return result
         
         # All URL patterns failed
         return CoverResult(
@@ -708,10 +921,63 @@ class BookCoverFetcher:
             }
         )
 
-    def _optimize_image(self, image_bytes, max_size=(300, 400)):
+    def _fetch_amazon_url(self, url, pattern, isbn) -> CoverResult:
         """
-        Optimize image - imports PIL locally.
-        This makes PIL optional for users who don't need optimization.
+        Fetch a single Amazon image URL pattern - returns CoverResult object.
+        """
+        try:
+            response = yield Get(url, timeout=8, headers={
+                "User-Agent": self.user_agent,
+                "Accept": "image/webp,image/apng,image/*,*/*;q=0.8",
+                "Accept-Language": "en-US,en;q=0.9",
+                "Referer": "https://www.amazon.com/"
+            })
+        except requests.exceptions.Timeout:
+            return CoverResult(None, "amazon", url, {"error": "timeout", "isbn": isbn, "url_pattern": pattern})
+        
+        content_length = len(response.content)
+        content_type = response.headers.get('content-type', '')
+        
+        # Heuristic: valid book covers are usually > 10KB
+        # Placeholder/error images are often smaller
+        if is_cover_response(response, "amazon"):
+            return CoverResult(
+                image_bytes=response.content,
+                source="amazon",
+                url=url,
+                metadata={
+                    "size_bytes": content_length,
+                    "content_type": content_type,
+                    "isbn": isbn,
+                    "url_pattern": pattern,
+                    "status_code": response.status_code,
+                    "fetched_at": time.time(),
+                    **validators(response),
+                    "note": "Direct Amazon image fetch - check ToS compliance"
+                }
+            )
+        
+        # Image too small, wrong type or error status - likely placeholder
+        return CoverResult(
+            image_bytes=None,
+            source="amazon",
+            url=url,
+            metadata={
+                "error": "invalid_image",
+                "status_code": response.status_code,
+                "size_bytes": content_length,
+                "isbn": isbn,
+                "url_pattern": pattern
+            }
+        )
+
+    def _optimize_image(self, image_bytes, max_size=(300, 400), fmt="JPEG"):
+        """
+        Optimize image - downscale to fit max_size and re-encode as JPEG or WEBP.
+        Imports PIL locally, this makes PIL optional for users who don't need optimization.
+        
+        Returns:
+            the re-encoded bytes, or None if PIL is missing or the image could not be converted
         """
         try:
             # LOCAL IMPORT - optional dependency
@@ -719,19 +985,71 @@ class BookCoverFetcher:
             import io
             
             img = Image.open(io.BytesIO(image_bytes))
-            # ... optimization logic ...
+            img = img.convert("RGB")
+            img.thumbnail(max_size, Image.LANCZOS)
+            
+            out = io.BytesIO()
+            if fmt == "WEBP":
+                img.save(out, format="WEBP", quality=WEBP_QUALITY, method=6)
+            else:
+                img.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            optimized_bytes = out.getvalue()
             
             return optimized_bytes
             
         except ImportError as e:
             # Clear error message
             logger.warning(f"PIL not available: {e}. Skipping optimization.")
-            return image_bytes
+            return None
             
         except Exception as e:
             # Don't crash on optimization errors
             logger.error(f"Optimization failed: {e}")
-            return image_bytes
+            return None
+
+    def make_variants(self, image_bytes) -> Dict[Tuple[str, str], bytes]:
+        """
+        Resized variants of a cover for the templates' srcset.
+        
+        Returns:
+            dict mapping (variant, extension) to image bytes, e.g. ("thumb", "webp"),
+            empty if PIL is not available (variants that could not be converted are left out)
+        """
+        try:
+            import PIL
+        except ImportError as e:
+            logger.warning(f"PIL not available: {e}. No cover variants created.")
+            return {}
+        
+        variants = {}
+        for variant, max_size in COVER_VARIANTS.items():
+            for ext, fmt in COVER_FORMATS.items():
+                optimized = self._optimize_image(image_bytes, max_size, fmt)
+                if optimized is not None:
+                    variants[(variant, ext)] = optimized
+        return variants
+
+def result_meta(result: CoverResult) -> Dict[str, Any]:
+    """Metadata of a fetched cover kept in the cover store's index (cache hits keep their origin)."""
+    return {
+        "source": result.metadata.get("origin") or result.source,
+        "url": result.metadata.get("origin_url") or result.url,
+        "etag": result.metadata.get("etag"),
+        "last_modified": result.metadata.get("last_modified"),
+    }
+
+# process-wide fetcher (one session / connection pool for all cover fetches)
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+def get_fetcher() -> BookCoverFetcher:
+    """Return the shared BookCoverFetcher, creating it on first use."""
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = BookCoverFetcher()
+    return _fetcher
 
 def get_cover_by_asin(fetcher, asin, size='M') -> CoverResult:
     """
@@ -740,6 +1058,10 @@ def get_cover_by_asin(fetcher, asin, size='M') -> CoverResult:
     Returns:
         CoverResult object
     """
+    return fetcher._run(asin_cover_steps(fetcher, asin, size))
+
+def asin_cover_steps(fetcher, asin, size='M'):
+    """Steps of get_cover_by_asin (see BookCoverFetcher._run)."""
     if not asin:
         return CoverResult(
             image_bytes=None,
@@ -757,15 +1079,15 @@ def get_cover_by_asin(fetcher, asin, size='M') -> CoverResult:
     
     if isbn:
         # Use ISBN-based fetcher
-        result = fetcher.get_cover(isbn=isbn, size=size)
-        if result.success:
+        result = yield from fetcher._cover_steps(isbn, None, None, size)
+        if result.success and not result.is_placeholder:
             result.metadata["original_asin"] = asin
             result.metadata["converted_isbn"] = isbn
             result.metadata["source"] = f"{result.source}_via_asin"
         return result
     
     # If no ISBN found, try direct ASIN methods
-    return get_cover_by_asin_direct(fetcher, asin, size)
+    return (yield from asin_direct_steps(asin, size))
 
 def asin_to_isbn(asin) -> Optional[str]:
     """Try to convert ASIN to ISBN."""
@@ -781,6 +1103,10 @@ def asin_to_isbn(asin) -> Optional[str]:
 
 def get_cover_by_asin_direct(fetcher, asin, size='M') -> CoverResult:
     """Try to get cover directly using ASIN."""
+    return fetcher._run(asin_direct_steps(asin, size))
+
+def asin_direct_steps(asin, size='M'):
+    """Steps of get_cover_by_asin_direct (see BookCoverFetcher._run)."""
     # Try Amazon image URL patterns
     url_patterns = [
         f"https://images-na.ssl-images-amazon.com/images/P/{asin}.01._SCLZZZZZZZ_.jpg",
@@ -789,7 +1115,7 @@ def get_cover_by_asin_direct(fetcher, asin, size='M') -> CoverResult:
     
     for url in url_patterns:
         try:
-            response = fetcher.session.get(url, timeout=8)
+            response = yield Get(url, timeout=8)
             if response.status_code == 200 and len(response.content) > 10000:
                 return CoverResult(
                     image_bytes=response.content,
@@ -799,7 +1125,9 @@ def get_cover_by_asin_direct(fetcher, asin, size='M') -> CoverResult:
                         "asin": asin,
                         "method": "direct_amazon_url",
                         "url_pattern": url_patterns.index(url),
-                        "size_bytes": len(response.content)
+                        "size_bytes": len(response.content),
+                        "fetched_at": time.time(),
+                        **validators(response)
                     }
                 )
         except:
@@ -817,24 +1145,79 @@ def get_cover_by_asin_direct(fetcher, asin, size='M') -> CoverResult:
         }
     )
 
-def get_kindle_book_cover(book_info_record, size='M') -> CoverResult:
+def is_known_missing(book_info_record, size='M') -> bool:
+    """Check the negative cache: did all sources fail for this book recently?"""
+    return get_fetcher()._check_negative_cache(
+        book_info_record.get('asin'),
+        book_info_record.get('title'),
+        book_info_record.get('authors'),
+        size
+    )
+
+def known_missing(book_info_records, size='M') -> set:
+    """ASINs of the books for which all sources failed recently (one negative cache query for all)."""
+    fetcher = get_fetcher()
+    keys = {
+        fetcher._create_cache_key(book.get('asin'), book.get('title'), book.get('authors'), size): book.get('asin')
+        for book in book_info_records
+    }
+    ages = fetcher.store.miss_ages(keys)
+    return {keys[key] for key, age in ages.items() if age < NEGATIVE_CACHE_TTL}
+
+def get_kindle_book_cover(book_info_record, size='M', revalidate=False) -> CoverResult:
     """
     Unified function for Kindle2Anki to get book covers.
     
     Args:
         book_info_record: Dictionary with keys 'asin', 'title', 'authors'
         size: Image size ('S', 'M', 'L')
+        revalidate: Ignore (and clear) a negative cache entry for the book
     
     Returns:
         CoverResult object with image data and metadata
     """
-    fetcher = BookCoverFetcher()
+    fetcher = get_fetcher()
+    return fetcher._run(kindle_book_cover_steps(fetcher, book_info_record, size, revalidate))
+
+async def get_kindle_book_cover_async(client, book_info_record, size='M', revalidate=False) -> CoverResult:
+    """get_kindle_book_cover in the running event loop, fetching with client (an httpx.AsyncClient)."""
+    fetcher = get_fetcher()
+    return await fetcher._run_async(client, kindle_book_cover_steps(fetcher, book_info_record, size, revalidate))
+
+def kindle_book_cover_steps(fetcher, book_info_record, size='M', revalidate=False):
+    """Steps of get_kindle_book_cover (see BookCoverFetcher._run)."""
+    negative_key = (
+        book_info_record.get('asin'),
+        book_info_record.get('title'),
+        book_info_record.get('authors'),
+        size
+    )
+    
+    # Books without a cover are remembered, so we don't crawl all sources on every view
+    if revalidate:
+        fetcher.clear_negative_cache(*negative_key)
+    elif fetcher._check_negative_cache(*negative_key):
+        return CoverResult(
+            image_bytes=fetcher._get_placeholder(
+                title=book_info_record.get('title'),
+                author=book_info_record.get('authors'),
+                size=size
+            ),
+            source="placeholder",
+            url="",
+            metadata={
+                "kindle_source": "negative_cache",
+                "kindle_id": book_info_record.get('id'),
+                "reason": "No cover found recently - using placeholder",
+                "is_placeholder": True
+            }
+        )
     
     # First try ASIN-based methods
     if book_info_record.get('asin'):
-        asin_result = get_cover_by_asin(fetcher, book_info_record['asin'], size=size)
+        asin_result = yield from asin_cover_steps(fetcher, book_info_record['asin'], size=size)
         
-        if asin_result.success:
+        if asin_result.success and not asin_result.is_placeholder:
             # Add Kindle-specific metadata
             asin_result.metadata.update({
                 "kindle_source": "asin",
@@ -844,13 +1227,14 @@ def get_kindle_book_cover(book_info_record, size='M') -> CoverResult:
             return asin_result
     
     # Fallback to title/author search
-    title_result = fetcher.get_cover(
-        title=book_info_record.get('title'),
-        author=book_info_record.get('authors'),
-        size=size
+    title_result = yield from fetcher._cover_steps(
+        None,
+        book_info_record.get('title'),
+        book_info_record.get('authors'),
+        size
     )
     
-    if title_result.success:
+    if title_result.success and not title_result.is_placeholder:
         # Add Kindle-specific metadata
         title_result.metadata.update({
             "kindle_source": "title_author_search",
@@ -861,7 +1245,8 @@ def get_kindle_book_cover(book_info_record, size='M') -> CoverResult:
         return title_result
     
     # Ultimate fallback: placeholder with book info
-    placeholder = fetcher.get_placeholder(
+    fetcher._save_negative_cache(*negative_key)
+    placeholder = fetcher._get_placeholder(
         title=book_info_record.get('title'),
         author=book_info_record.get('authors'),
         size=size
@@ -1,4 +1,5 @@
 # import requests
+import os
 from pathlib import Path
 from flask import redirect, render_template, session, current_app, url_for
 import re
@@ -8,15 +9,21 @@ import secrets
 # import sqlite3
 # from datetime import datetime
 from cs50 import SQL
-from flask import Flask, flash, redirect, render_template, request, session
-from flask_session import Session
+from flask import Flask, abort, flash, g, get_flashed_messages, redirect, render_template, request, session
+from werkzeug.utils import send_file as werkzeug_send_file
 from werkzeug.security import check_password_hash, generate_password_hash
 from email_validator import validate_email, EmailNotValidError
 from functools import wraps
-from db_helpers import clear_user_from_db, get_usage, get_db_handle, get_book_by_id, unlink_deck, unlink_decks4asin, unlink_decks, insert_deck, write_history_entry
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
+import asyncio
+import threading
+import time
+from db_helpers import get_token_user, clear_user_from_db, get_usage, get_db_handle, get_book_by_id, unlink_deck, unlink_decks4asin, unlink_decks, insert_deck, write_history_entry, write_slim_vocabdb, clear_vocab_from_db, get_known_asins, get_vocabdb_books, count_decks, get_decknames, get_linked_decks, open_vocabdb, update_deck_job
 from get_bookcover import *
+from cover_store import get_cover_store, asin_key, variant_key
 from k2a_dictionaries import get_dictionaries 
-from pyrae import dle
+from admission import deck_build_gate, DECK_BUILDS_MAX_ACTIVE, DECK_BUILDS_MAX_QUEUED
+import async_runtime
 import requests
 import logging
 # import chardet 
@@ -24,8 +31,8 @@ from urllib.error import HTTPError
 from urllib.parse import quote, unquote
 from requests.adapters import HTTPAdapter
 from requests.exceptions import RetryError
-from kindle2anki import *
-import genanki
+# kindle2anki (and with it genanki, pyrae, beautiful soup) is only imported by the deck build,
+# so workers start without it and pages like /login never load it
 
 def get_user_data_path(user_id: int | str) -> Path:
     user_dir = f"{int(user_id):06d}"
@@ -44,6 +51,22 @@ def get_vocabdb_path(user_id: str) -> Path:
 def vocabdb_exists(user_id: str) -> bool:
     return get_vocabdb_path(user_id).is_file()
 
+def save_vocabdb(conn, user_id, logger):
+    """ write a slimmed copy of a validated (in-memory) vocab db to the user's data folder
+    (via a temp file in the same folder, so the replace is atomic)"""
+    upload_path = get_user_data_path(user_id)
+    upload_path.mkdir(parents=True, exist_ok=True)
+    file_path = upload_path / "vocab.db"
+    tmp_path = upload_path / f".vocab.{secrets.token_hex(8)}.tmp"
+    try:
+        write_slim_vocabdb(conn, tmp_path, logger)
+        os.replace(tmp_path, file_path)
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    logger.info(f"save_vocabdb: saved vocab.db for user {user_id} to {file_path}")
+    return file_path
+
 def is_sqlite_db(file):
     header = file.read(16)
     file.seek(0)
@@ -66,6 +89,36 @@ def login_required(f):
 
     return decorated_function
 
+def bearer_token():
+    """ the token of an "Authorization: Bearer <token>" header, or None"""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return token.strip()
+
+def login_or_token_required(db):
+    """
+    Decorate routes to require login, or an API token ("Authorization: Bearer <token>")
+    for routes API clients link to (e.g. book covers). The user id is put into g.user_id.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            token = bearer_token()
+            if token is not None:
+                g.user_id = get_token_user(db, token)
+                if g.user_id is None:
+                    abort(401)
+            elif session.get("user_id") is not None:
+                g.user_id = session["user_id"]
+            else:
+                return redirect("/login")
+            return f(*args, **kwargs)
+        return decorated_function
+
+    return decorator
+
 def valid_name(name, logger):
     """validate name submitted for account creation"""
     isValid = True
@@ -185,13 +238,15 @@ def clear_all(db, user_id, logger):
     except Exception as e:
         flash(f"❌ Failure to delete user's data folder, a filesystem error occured: {e}")
     session['vocabdb_uploaded'] = False
+    clear_vocab_from_db(db, user_id, logger)
 
     unlink_decks(db, user_id, logger) 
     session['num_decks'] = 0
     return True
 
-def clear_vocab_db(user_id, logger):
+def clear_vocab_db(db, user_id, logger):
     """ delete user's vocab db file"""
+    clear_vocab_from_db(db, user_id, logger)
     vocab_db_path = get_vocabdb_path(user_id)
     if not vocab_db_path.exists():
         logger.warning(f"User vocab_db_path does not exist: {vocab_db_path}")
@@ -208,24 +263,12 @@ def clear_vocab_db(user_id, logger):
     session['vocabdb_uploaded'] = False
     return True
 
-def has_decks(user_id, logger):
-    """Check if user has any .apkg deck files."""
-    user_data_path = get_user_data_path(user_id)
+def has_decks(db, user_id, logger):
+    """Check if user has any decks (counted in the decks table, see reconcile_decks)."""
     logger.info(f"has_decks: checking for decks for user {user_id} ...")
-
-    if not user_data_path.exists():
-        logger.warning(f"User data path does not exist: {user_data_path}")
-        return False
-
-    deck_files = list(user_data_path.glob("*.apkg"))
-    if deck_files:
-        session['num_decks'] = len(deck_files)
-        logger.info(f"User {user_id} has {len(deck_files)} deck(s).")
-        return True
-    else:
-        logger.info(f"User {user_id} has no decks.")
-        session['num_decks'] = 0
-        return False
+    session['num_decks'] = count_decks(db, user_id)
+    logger.info(f"User {user_id} has {session['num_decks']} deck(s).")
+    return session['num_decks'] > 0
 
 def clear_decks(db, user_id, logger):
     """Delete all .apkg deck files for the given user."""
@@ -265,7 +308,8 @@ def clear_decks4asin(db, user_id, asin, logger):
 
     deleted = 0
 
-    for deck in user_data_path.glob(f"{asin}*.apkg"):
+    for deckname in get_decknames(db, user_id, asin):
+        deck = user_data_path / deckname
         try:
             deck.unlink()
             deleted += 1
@@ -275,12 +319,74 @@ def clear_decks4asin(db, user_id, asin, logger):
 
     # "unlink" user's decks in decks table
     unlink_decks4asin(db, user_id, asin, logger)
-    session['num_decks'] -= deleted
+    session['num_decks'] = count_decks(db, user_id)
 
     logger.info(f"clear_decks: deleted {deleted} deck(s) for user {user_id}")
     flash(f"✅ deleted {deleted} deck(s)", "success")
     return True 
 
+def send_deck_file(user_id, deck):
+    """ response sending one of the user's decks (conditional and Range requests are answered by
+    send_file, or by the front proxy if DECK_ACCEL_REDIRECT / DECK_X_SENDFILE is configured)
+    :param deck: deck record as returned by get_deck_by_id"""
+    user_dir = f"{int(user_id):06d}"
+    deckname = deck['deckname']
+    lang = deck['lang'].upper()
+    authors = deck['authors']
+    if ', ' in authors:
+        last, first = authors.split(', ')
+        authors = first + ' ' + last
+    title = deck['title']
+
+    filepath = get_user_data_path(user_id) / deckname
+    if not filepath.exists():
+        abort(404)
+
+    # download_name= f"{lang}_{authors}_{title}.apkg"
+    download_name= f"{authors} - {title}.apkg"
+
+    accel_prefix = current_app.config.get("DECK_ACCEL_REDIRECT")
+    response = werkzeug_send_file(
+        filepath,
+        request.environ,
+        as_attachment=True,
+        download_name=download_name,
+        use_x_sendfile=current_app.config.get("DECK_X_SENDFILE", False) or bool(accel_prefix),
+        response_class=current_app.response_class,
+    )
+    if accel_prefix:
+        # nginx serves the file from its internal location (the body is empty already)
+        del response.headers["X-Sendfile"]
+        response.headers["X-Accel-Redirect"] = quote(f"{accel_prefix.rstrip('/')}/{user_dir}/{deckname}")
+    # decks are private, but browsers may keep them and revalidate with ETag / Last-Modified
+    response.cache_control.private = True
+    response.cache_control.max_age = 0
+    return response
+
+def reconcile_decks(db, logger, delete_orphans=False):
+    """ make the decks table agree with the deck files in the userdata folders:
+    decks whose file is gone are unlinked, deck files no deck points to are reported
+    (and deleted if delete_orphans is set)
+    :return: (number of decks unlinked, list of orphaned deck files)"""
+    userdata = Path(current_app.root_path) / "static" / "userdata"
+    linked = set()
+    unlinked = 0
+    for deck in get_linked_decks(db):
+        deck_file = get_user_data_path(deck['user_id']) / deck['deckname']
+        if deck_file.is_file():
+            linked.add(deck_file)
+        else:
+            if unlink_deck(db, deck['user_id'], deck['id'], logger):
+                logger.info(f"reconcile_decks: unlinked deck {deck['id']}, {deck_file} does not exist")
+                unlinked += 1
+
+    orphans = [deck_file for deck_file in sorted(userdata.glob("*/*.apkg")) if deck_file not in linked]
+    for deck_file in orphans:
+        logger.info(f"reconcile_decks: {deck_file} belongs to no deck")
+        if delete_orphans:
+            deck_file.unlink(missing_ok=True)
+    return unlinked, orphans
+
 def clear_single_deck(db, user_id, deck_id, deckname, logger):
     """Delete a single .apkg deck for the given user.
     naming convention being: asin.apkg"""
@@ -296,39 +402,256 @@ def clear_single_deck(db, user_id, deck_id, deckname, logger):
     try:
         deck_file.unlink()
         logger.info(f"Deleted deck file: {deck_file.name}")
-        session['num_decks'] -= 1
     except Exception as e:
         logger.error(f"Failed to delete {deck_file}: {e}")
 
     # 'unlink' deck in decks table
-    unlink_deck(db, user_id, deck_id, logger)
+    if not unlink_deck(db, user_id, deck_id, logger):
+        flash(f'❌ a database error occured while deleting deck {deckname}', 'error')
+        return False
+    session['num_decks'] = count_decks(db, user_id)
     logger.info(f"unlink_deck: deleted deck with deck_id {deck_id}")
     flash(f"✅ deleted 1 deck", "success")
     return True
 
-def get_book_cover(book, logger):
-    """ get safe book cover url or default"""
-    result = get_kindle_book_cover(book, size='S') 
-    imagedir = Path(current_app.root_path) / "static" / "covers"
-    if not imagedir.exists():
-        imagedir.mkdir(parents=True, exist_ok=True)
-
-    # Save cover
-    if result.image_bytes:
-        # safe_title = book['title'].replace(' ', '_').replace(':', '')
-        # filename = f"{safe_title}.jpg"
-        filename = f"{book['asin']}.jpg"
-        imagepath = imagedir / filename
-        with open(f"{imagepath}", "wb") as f:
-            f.write(result.image_bytes)
-            logger.info(f"safe_book_cover: saved cover as {imagepath}")  
-    """ return safe book cover url or default"""
-    if result is None:
-        logger.info(f"safe_book_cover: no cover found, using default")
-        return "/static/img/book_cover_default.png"
-    else:
-        logger.info(f"safe_book_cover: using found cover")
-        return filename
+# covers for the book list are fetched concurrently, the page is rendered
+# with whatever resolved within COVER_DEADLINE seconds
+COVER_WORKERS = 8
+COVER_DEADLINE = 6
+# covers are fetched at medium size, the thumbnails are derived from it
+COVER_FETCH_SIZE = 'M'
+COVER_MIMETYPES = {"webp": "image/webp", "jpg": "image/jpeg"}
+# stored covers are revalidated against their origin after this many seconds, in batches
+COVER_REVALIDATE_AGE = 30 * 24 * 60 * 60
+COVER_REVALIDATE_BATCH = 200
+# bulk pre-warming (flask warm-covers) stays below this many cover fetches per second
+COVER_WARM_RATE = 2.0
+COVER_WARM_WORKERS = 4
+cover_executor = ThreadPoolExecutor(max_workers=COVER_WORKERS, thread_name_prefix="cover")
+
+def get_book_cover(book, logger, revalidate=False):
+    """ fetch book cover, put it and its resized variants into the cover store
+    under the book's asin and return the hash of the original
+    only one thread or process fetches a given asin at a time, the others wait and
+    use its result"""
+    store = get_cover_store()
+    key = asin_key(book['asin'])
+    with store.lock(key):
+        # someone else may have fetched it (or found there is none) while we waited
+        if not revalidate:
+            found = store.lookup(key)
+            if found:
+                return found[0].name
+            if is_known_missing(book, size=COVER_FETCH_SIZE):
+                return None
+        return fetch_book_cover(book, logger, revalidate)
+
+def fetch_book_cover(book, logger, revalidate=False):
+    """ fetch book cover and store it (see get_book_cover, which holds the asin's lock)"""
+    result = get_kindle_book_cover(book, size=COVER_FETCH_SIZE, revalidate=revalidate) 
+
+    # Save cover (placeholders are not saved, the negative cache decides when to look again)
+    if result is None or not result.image_bytes or result.is_placeholder:
+        logger.info(f"safe_book_cover: no cover found for {book['asin']}")
+        return None
+    digest = store_book_cover(book['asin'], result)
+    logger.info(f"safe_book_cover: stored cover for {book['asin']} as {digest}")  
+    return digest
+
+async def get_book_cover_async(book, logger, revalidate=False):
+    """ get_book_cover in the event loop (see asgi.py): the sources are awaited, threads are
+    only used to wait for the asin's lock and to store the cover and its variants"""
+    store = get_cover_store()
+    key = asin_key(book['asin'])
+    lock = store.lock(key)
+    await asyncio.to_thread(lock.__enter__)
+    try:
+        if not revalidate:
+            found = store.lookup(key)
+            if found:
+                return found[0].name
+            if is_known_missing(book, size=COVER_FETCH_SIZE):
+                return None
+        result = await get_kindle_book_cover_async(
+            async_runtime.client(), book, size=COVER_FETCH_SIZE, revalidate=revalidate
+        )
+        if result is None or not result.image_bytes or result.is_placeholder:
+            logger.info(f"safe_book_cover: no cover found for {book['asin']}")
+            return None
+        digest = await asyncio.to_thread(store_book_cover, book['asin'], result)
+        logger.info(f"safe_book_cover: stored cover for {book['asin']} as {digest}")
+        return digest
+    finally:
+        await asyncio.to_thread(lock.__exit__, None, None, None)
+
+def store_book_cover(asin, result):
+    """ put a fetched cover (with its source, url and HTTP validators) and its resized
+    variants into the cover store under asin
+    :return: hash of the original"""
+    store = get_cover_store()
+    mime = result.metadata.get("content_type", "image/jpeg")
+    digest = store.put(asin_key(asin), result.image_bytes, mime, meta=result_meta(result))
+    for (variant, ext), image_bytes in get_fetcher().make_variants(result.image_bytes).items():
+        store.put(variant_key(asin, variant, ext), image_bytes, COVER_MIMETYPES[ext])
+    return digest
+
+def revalidate_covers(logger, max_age=COVER_REVALIDATE_AGE, limit=COVER_REVALIDATE_BATCH):
+    """ ask the origins of stored covers not validated for max_age seconds whether they changed
+    (conditional GET with ETag / Last-Modified), most requested covers first
+    :return: dict counting unchanged, updated and failed covers"""
+    store = get_cover_store()
+    fetcher = get_fetcher()
+    counts = {"unchanged": 0, "updated": 0, "failed": 0}
+    for entry in store.due_for_revalidation(max_age, limit):
+        asin = entry['key'].removeprefix(asin_key(""))
+        result = fetcher.revalidate(entry['url'], entry['etag'], entry['last_modified'], source=entry['source'])
+        if result.metadata.get("not_modified"):
+            store.mark_validated(entry['key'], result.metadata.get("etag"), result.metadata.get("last_modified"))
+            counts["unchanged"] += 1
+        elif result.success and not result.is_placeholder:
+            # keep the source of the original fetch, only bytes and validators changed
+            result.metadata["origin"] = entry['source']
+            with store.lock(entry['key']):
+                digest = store_book_cover(asin, result)
+            logger.info(f"revalidate_covers: cover of {asin} changed, stored as {digest}")
+            counts["updated"] += 1
+        else:
+            # the stored cover is kept
+            logger.warning(f"revalidate_covers: could not revalidate {asin}: {result.metadata}")
+            counts["failed"] += 1
+    return counts
+
+# asin -> future of the cover fetches currently in flight
+pending_covers = {}
+pending_covers_lock = threading.Lock()
+
+def schedule_book_cover(book, logger, revalidate=False):
+    """ start a background fetch of the book's cover unless one is already running
+    (in the event loop when served by asgi.py, else on a cover thread)
+    :return: the future of the (new or already running) fetch"""
+    asin = book['asin']
+    with pending_covers_lock:
+        future = pending_covers.get(asin)
+        if future is not None:
+            return future
+        if async_runtime.active():
+            future = async_runtime.submit(get_book_cover_async(book, logger, revalidate))
+        else:
+            future = cover_executor.submit(get_book_cover, book, logger, revalidate)
+        pending_covers[asin] = future
+
+    def forget(_):
+        with pending_covers_lock:
+            pending_covers.pop(asin, None)
+    future.add_done_callback(forget)
+    return future
+
+def get_book_covers(books, logger, deadline=COVER_DEADLINE):
+    """ fetch the covers of all books missing in the cover store concurrently
+    (the store and the negative cache are checked with one query each for all books)
+    :return: (covers, missing) - dict mapping asin to cover hash for every book whose cover
+             is available within deadline seconds (fetches still running keep going in the
+             background) and the set of asins no source had a cover for recently"""
+    store = get_cover_store()
+    found = store.lookup_many(asin_key(book['asin']) for book in books)
+    covers = {}
+    for book in books:
+        if asin_key(book['asin']) in found:
+            covers[book['asin']] = found[asin_key(book['asin'])][0].name
+    missing = known_missing([book for book in books if book['asin'] not in covers], size=COVER_FETCH_SIZE)
+    futures = {}
+    for book in books:
+        if book['asin'] in covers or book['asin'] in missing or book['asin'] in futures.values():
+            continue
+        futures[schedule_book_cover(book, logger)] = book['asin']
+
+    if futures and deadline > 0:
+        done, not_done = wait(futures, timeout=deadline)
+        for future in done:
+            try:
+                digest = future.result()
+            except Exception as e:
+                logger.error(f"get_book_covers: fetching cover for {futures[future]} failed: {e}")
+                continue
+            if digest:
+                covers[futures[future]] = digest
+        if not_done:
+            logger.info(f"get_book_covers: {len(not_done)} cover(s) not resolved within {deadline}s")
+    return covers, missing
+
+def rate_limiter(rate):
+    """ return a function that blocks its callers so that together they pass at most
+    rate times per second"""
+    if rate <= 0:
+        raise ValueError(f"rate must be positive, got {rate}")
+    lock = threading.Lock()
+    next_slot = time.monotonic()
+
+    def acquire():
+        nonlocal next_slot
+        with lock:
+            now = time.monotonic()
+            slot = max(next_slot, now)
+            next_slot = slot + 1 / rate
+        time.sleep(slot - now)
+    return acquire
+
+def get_all_books(db, logger):
+    """ every book known to the app (one record per asin): the central catalog of ingested
+    uploads first, then books only found in users' vocab.db files"""
+    books = {book['asin']: book for book in get_known_asins(db)}
+    userdata = Path(current_app.root_path) / "static" / "userdata"
+    for vocab_db_path in sorted(userdata.glob("*/vocab.db")):
+        try:
+            for book in get_vocabdb_books(vocab_db_path):
+                books.setdefault(book['asin'], book)
+        except Exception as e:
+            logger.warning(f"get_all_books: skipping unreadable {vocab_db_path}: {e}")
+    return list(books.values())
+
+def warm_book_covers(books, logger, rate=COVER_WARM_RATE, workers=COVER_WARM_WORKERS, progress=None):
+    """ fetch the covers of all books that are neither in the cover store nor known to be missing,
+    at most rate fetches per second - an interrupted run resumes where it stopped
+    :param progress: optional callback(done, total, asin, status) called after each book
+    :return: dict counting stored, missing and failed covers and skipped books"""
+    store = get_cover_store()
+    counts = {"stored": 0, "missing": 0, "failed": 0, "skipped": 0}
+    todo = []
+    for book in books:
+        if store.has(asin_key(book['asin'])) or is_known_missing(book, size=COVER_FETCH_SIZE):
+            counts["skipped"] += 1
+        else:
+            todo.append(book)
+
+    throttle = rate_limiter(rate)
+    def fetch(book):
+        throttle()
+        return get_book_cover(book, logger)
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cover-warm")
+    try:
+        futures = {executor.submit(fetch, book): book['asin'] for book in todo}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                status = "stored" if future.result() else "missing"
+            except Exception as e:
+                logger.error(f"warm_book_covers: fetching cover for {futures[future]} failed: {e}")
+                status = "failed"
+            counts[status] += 1
+            if progress:
+                progress(done, len(todo), futures[future], status)
+    finally:
+        # on Ctrl-C drop the queued fetches, the next run picks them up
+        executor.shutdown(wait=True, cancel_futures=True)
+    return counts
+
+def get_cover_placeholder(book):
+    """ placeholder image (jpeg bytes) showing the book's title and authors"""
+    return get_fetcher()._get_placeholder(book.get('title'), book.get('authors'), size='S')
+
+def valid_asin(asin):
+    """ ASINs (or the ids used for sideloaded books) are short alphanumeric strings"""
+    return re.fullmatch(r"[A-Za-z0-9_-]{1,64}", asin or "") is not None
 
 def select_dict(lang, logger):
     # flash('select_dict called', 'info')
@@ -345,37 +668,92 @@ def select_dict(lang, logger):
 def select_card_type(lang, logger):
     pass
 
-def create_card_deck(db, vdb, deck_request, logger):
-    from kindle2anki import connect, get_definitions, get_definitions_rae, create_deck, create_cards 
-    # flash(f'create_card_deck called with {deck_request}', 'info')
-    tables = db.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
-    # flash(f'create_card_deck - tables: {tables}')
-    # read values from deck_request
-    book_id = deck_request['book_id']
-    dict_id = deck_request['dict_id']
-    card_type = deck_request['card_type']
-    # flash(f'deck_request processed ...)', 'info')
-    user_id = session['user_id']
-    # get vocatb db path
+# dictionary lookups of one deck build in flight at the same time (kept low to stay polite
+# to the dictionary sites, admission.py bounds how many builds run at once)
+DICT_LOOKUP_CONCURRENCY = 4
+
+class DeckBuildError(Exception):
+    """ a deck could not be built (unknown book or dictionary, no definitions found)"""
+
+def build_card_deck(db, vdb, user_id, book_id, dict_id, card_type, logger, report=None):
+    """ look up the words of a book in a dictionary, write the card deck to the user's data folder
+    and record it in the decks and history tables (no session or flash messages involved, so
+    it also runs in background jobs)
+    :param report:  optional callback(message, category) for progress messages
+    :return:        dict with book, deck_id, deckname, cards and skipped (words without definition)
+    :raises DeckBuildError: if the deck cannot be built"""
+    from kindle2anki import connect, get_definitions, get_definitions_rae
+    report = report or (lambda message, category: logger.info(message))
+    deck = prepare_card_deck(vdb, book_id, dict_id)
+    dict = deck['dict']
+
+    num_log_level = 6
+    string_log_level = 'info'
+    # establish a connection to the dictionary URL of the chosen dictionary
+    report(f'establishing connection to dictionary {dict["name"]} ...', 'info')
+    if deck['rae'] == False:
+        s = connect(dict['url'], dict['referer'], num_log_level)
+
+        # retrieve dictinary definitions for the words in our book that were looked up in kindle
+        report(f'retrieving definitions from dictionary {dict["name"]} ...', 'info')
+        titles, definitions = get_definitions(s, dict, deck['words'], num_log_level, logger, concurrency=DICT_LOOKUP_CONCURRENCY)
+
+        # close the https session
+        s.close()
+    else:
+        # connection will be handled by pyrae module
+        titles, definitions = get_definitions_rae(deck['words'], string_log_level, logger)
+
+    return write_card_deck(db, user_id, deck, card_type, titles, definitions, logger, report)
+
+async def build_card_deck_async(db, vdb, user_id, book_id, dict_id, card_type, logger, report=None):
+    """ build_card_deck in the event loop (see asgi.py): the dictionary lookups are awaited,
+    reading the vocab db, pyrae (RAE dictionary, blocking) and writing the deck run on threads
+    :return:        dict like build_card_deck
+    :raises DeckBuildError: if the deck cannot be built"""
+    from kindle2anki import connect_async, get_definitions_async, get_definitions_rae
+    report = report or (lambda message, category: logger.info(message))
+    deck = await asyncio.to_thread(prepare_card_deck, vdb, book_id, dict_id)
+    dict = deck['dict']
+
+    num_log_level = 6
+    string_log_level = 'info'
+    report(f'establishing connection to dictionary {dict["name"]} ...', 'info')
+    if deck['rae'] == False:
+        client = await connect_async(dict['url'], dict['referer'], num_log_level)
+        try:
+            report(f'retrieving definitions from dictionary {dict["name"]} ...', 'info')
+            titles, definitions = await get_definitions_async(
+                client, dict, deck['words'], num_log_level, logger, concurrency=DICT_LOOKUP_CONCURRENCY
+            )
+        finally:
+            await client.aclose()
+    else:
+        titles, definitions = await asyncio.to_thread(get_definitions_rae, deck['words'], string_log_level, logger)
+
+    return await asyncio.to_thread(write_card_deck, db, user_id, deck, card_type, titles, definitions, logger, report)
+
+def prepare_card_deck(vdb, book_id, dict_id):
+    """ book, dictionary and looked up words (with their usage) of a deck to be built
+    :return:        dict with book, dict, dict_id, rae (RAE dictionary, looked up by pyrae), usage and words
+    :raises DeckBuildError: if book or dictionary are unknown"""
+    from kindle2anki import get_usage
 
     # get book info
-    # flash(f'calling get_book_by_id book id {book_id} ...', 'info')
-    book = get_book_by_id(db, vdb, book_id, logger)
+    rows = vdb.execute("SELECT id, lang, asin, title, authors FROM BOOK_INFO WHERE id = ?", book_id)
+    if not rows:
+        raise DeckBuildError(f'book with id {book_id} not found in vocab db')
+    book = rows[0]
 
     # get book language
     lang = book['lang']
 
     # get dictionary info
-    # flash(f'calling get_dictionaries for lang {lang} ...', 'info')
     dictionaries = get_dictionaries(lang)
-    # flash(f'found {len(dictionaries)} dictionaries for lang {lang} ...', 'info')
-    # flash(f'dictionaries: {dictionaries} ...', 'info')
     dict_id = int(dict_id)
     dict = next((d for d in dictionaries if d['id'] == dict_id), None)
     if dict is None:
-        flash(f'No dictionary found for id {dict_id}', 'error')
-        return None
-    # flash(f'Using dictionary: {dict}', 'info')
+        raise DeckBuildError(f'No dictionary found for id {dict_id}')
     # special handling for RAE dictionary
     if dict['url'] == 'https://dle.rae.es/':
         rae = True
@@ -383,61 +761,141 @@ def create_card_deck(db, vdb, deck_request, logger):
         rae = False
 
     # get usage info for words looked up in this book
-    # flash(f'getting usage info for book {book["title"]} ...', 'info')
     usage = get_usage(vdb, book)
     # for convenience get the words (keys of usage) as a list
     words = list(usage.keys())
+    return {"book": book, "dict": dict, "dict_id": dict_id, "rae": rae, "usage": usage, "words": words}
 
-    num_log_level = 6
-    string_log_level = 'info'
-    # establish a connection to the dictionary URL of the chosen dictionary
-    flash(f'establishing connection to dictionary {dict["name"]} ...', 'info')
-    if rae == False:
-        s = connect(dict['url'], dict['referer'], num_log_level)
-
-        # retrieve dictinary definitions for the words in our book that were looked up in kindle
-        flash(f'retrieving definitions from dictionary {dict["name"]} ...', 'info')
-        titles, definitions = get_definitions(s, dict, words, num_log_level, logger)
-
-        # close the https session
-        s.close()
-    else:
-        # connection will be handled by pyrae module
-        titles, definitions = get_definitions_rae(words, string_log_level, logger)
-
+def write_card_deck(db, user_id, deck, card_type, titles, definitions, logger, report):
+    """ write the cards of a prepared deck (see prepare_card_deck) to an apkg file in the user's
+    data folder and record it in the decks and history tables
+    :return:        dict like build_card_deck
+    :raises DeckBuildError: if no word has a definition or the deck cannot be recorded"""
+    import genanki
+    from kindle2anki import create_deck, create_cards
+    book, dict, dict_id, words = deck['book'], deck['dict'], deck['dict_id'], deck['words']
 
     # create the anki card deck
-    flash(f'creating anki deck for book {book["title"]} ...', 'info')
+    report(f'creating anki deck for book {book["title"]} ...', 'info')
 
-    deck_internal_name = f'{book['authors']} - {book['title']}'
+    deck_internal_name = f"{book['authors']} - {book['title']}"
     deckname = f"{book['asin']}_{book['lang']}_{dict_id}.apkg"
-    deckpath = get_user_data_path(session['user_id']) / deckname
-    # flash(f'creating deck {deckname} ...', 'info')
-    deck = create_deck(deck_internal_name, logger)
+    deckpath = get_user_data_path(user_id) / deckname
+    anki_deck = create_deck(deck_internal_name, logger)
 
     # add cards to the card deck (of the chosen card type, one per word)
-    flash(f'adding cards to deck {deckname}...', 'info')
-    has_cards, cards = create_cards(deck, dict, card_type, words, usage, titles, definitions, logger)
-    # flash(f'create_card_decks: obtained has_cards: {has_cards} cards:  {cards}...', 'warning')
+    report(f'adding cards to deck {deckname}...', 'info')
+    has_cards, cards = create_cards(anki_deck, dict, card_type, words, deck['usage'], titles, definitions, logger)
     if has_cards == False:
-        flash(f'Too bad - no definitions found in selected dictionary for words in selected book!', "error")
-        return has_cards 
+        raise DeckBuildError('Too bad - no definitions found in selected dictionary for words in selected book!')
+    # one summary instead of a message per card
+    report(f'✅ added {cards} cards, skipped {len(words) - cards} words without definition', 'info')
     # write out card deck to a apkg file
-    flash(f'writing out card deck to <your_userdata_directory>/{deckname}...', 'info')
+    report(f'writing out card deck to <your_userdata_directory>/{deckname}...', 'info')
     logger.info(f'writing out card deck to {deckpath}...')
-    genanki.Package(deck).write_to_file(deckpath)
+    deckpath.parent.mkdir(parents=True, exist_ok=True)
+    genanki.Package(anki_deck).write_to_file(deckpath)
 
     # insert record to deck table
     asin = book['asin']
     deck_id = insert_deck(db, user_id, asin, deckname, cards, logger)
-    user_dir = f"{int(user_id):06d}"
-    # download_url = url_for('static', filename=f"userdata/{user_dir}/{deckname}")
+    if deck_id is None:
+        raise DeckBuildError('a database error occured while recording the deck')
 
     # insert record to history table
     timestamp = int(time.time())
-    write_history_entry(db, user_id, deck_id, dict_id, book['authors'], book['title'], book['lang'], timestamp, logger)
-    # flash(f'create_card_deck: returning book {book} and cards {cards}')
-    return book, cards, deck_id
+    if not write_history_entry(db, user_id, deck_id, dict_id, book['authors'], book['title'], book['lang'], timestamp, logger):
+        report('❌ a database error occured while writing history entry', 'error')
+    return {"book": book, "deck_id": deck_id, "deckname": deckname, "cards": cards, "skipped": len(words) - cards}
+
+# deck builds queued as jobs (API, and the create form when served by asgi.py) run in the
+# background; every admitted job gets a thread (queued ones wait in deck_build_gate, which
+# decides how many actually run), under asgi.py they are coroutines instead
+DECK_JOB_WORKERS = DECK_BUILDS_MAX_ACTIVE + DECK_BUILDS_MAX_QUEUED
+deck_job_executor = ThreadPoolExecutor(max_workers=DECK_JOB_WORKERS, thread_name_prefix="deck-job")
+
+def submit_deck_job(app, db, job_id, user_id, book_id, dict_id, card_type, logger):
+    """ run a deck job (see insert_deck_job), whose place in deck_build_gate's queue is
+    already reserved, in the background
+    :return: future of the job"""
+    if async_runtime.active():
+        return async_runtime.submit(run_deck_job_async(app, db, job_id, user_id, book_id, dict_id, card_type, logger))
+    return deck_job_executor.submit(run_deck_job, app, db, job_id, user_id, book_id, dict_id, card_type, logger)
+
+def run_deck_job(app, db, job_id, user_id, book_id, dict_id, card_type, logger):
+    with app.app_context():
+        try:
+            with deck_build_gate.run(user_id):
+                update_deck_job(db, job_id, "running")
+                vdb = open_vocabdb(get_vocabdb_path(user_id))
+                result = build_card_deck(db, vdb, user_id, book_id, dict_id, card_type, logger)
+        except Exception as e:
+            finish_deck_job(db, job_id, logger, error=e)
+        else:
+            finish_deck_job(db, job_id, logger, result=result)
+
+async def run_deck_job_async(app, db, job_id, user_id, book_id, dict_id, card_type, logger):
+    with app.app_context():
+        try:
+            async with deck_build_gate.run_async(user_id):
+                update_deck_job(db, job_id, "running")
+                vdb = open_vocabdb(get_vocabdb_path(user_id))
+                result = await build_card_deck_async(db, vdb, user_id, book_id, dict_id, card_type, logger)
+        except Exception as e:
+            finish_deck_job(db, job_id, logger, error=e)
+        else:
+            finish_deck_job(db, job_id, logger, result=result)
+
+def finish_deck_job(db, job_id, logger, result=None, error=None):
+    """ record the outcome of a deck job (the result of build_card_deck or the exception raised)"""
+    if isinstance(error, DeckBuildError):
+        update_deck_job(db, job_id, "failed", message=str(error))
+    elif error is not None:
+        logger.error(f"deck job {job_id} failed: {error}", exc_info=error)
+        update_deck_job(db, job_id, "failed", message="internal error while building the deck")
+    else:
+        update_deck_job(db, job_id, "done",
+                        message=f"{result['cards']} cards, {result['skipped']} words without definition skipped",
+                        deck_id=result["deck_id"], cards=result["cards"])
+
+def create_card_deck(db, vdb, deck_request, logger):
+    """ build the deck requested by the create form for the logged in user, reporting
+    progress as flash messages
+    :return: (book, cards, deck_id), or None if the deck could not be built"""
+    try:
+        result = build_card_deck(
+            db, vdb, session['user_id'],
+            deck_request['book_id'], deck_request['dict_id'], deck_request['card_type'],
+            logger, report=flash
+        )
+    except DeckBuildError as e:
+        flash(str(e), 'error')
+        return None
+    # the form shows cover and stats of the book
+    book = get_book_by_id(db, vdb, result['book']['id'], logger)
+    return book, result['cards'], result['deck_id']
+
+# at most this many flash messages are stored / shown at once, repeated ones are counted instead
+FLASH_LIMIT = 12
+
+def aggregate_flashes(flashes, limit=FLASH_LIMIT):
+    """ collapse identical flash messages into one "message (×n)" and keep at most limit
+    messages, the rest is summarized in the last one
+    :param flashes: list of (category, message) as kept in session['_flashes']
+    :return: list of (category, message)"""
+    counts = {}
+    for category, message in flashes:
+        counts[(category, message)] = counts.get((category, message), 0) + 1
+    aggregated = [(category, message if n == 1 else f"{message} (×{n})") for (category, message), n in counts.items()]
+    if len(aggregated) > limit:
+        more = len(aggregated) - (limit - 1)
+        aggregated = aggregated[:limit - 1] + [("info", f"… and {more} more messages")]
+    return aggregated
+
+def get_flashed_summary(with_categories=False, category_filter=()):
+    """ get_flashed_messages for templates, aggregated (see aggregate_flashes)"""
+    messages = aggregate_flashes(get_flashed_messages(with_categories=True, category_filter=category_filter))
+    return messages if with_categories else [message for _, message in messages]
 
 def get_language_name(lang_code):
     lang_map = {
@@ -1,12 +1,12 @@
 #!/usr/local/bin/python3
 
 # imports
-from flask import flash
 from sys import exit, argv
 from os import path, access, R_OK
 import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from cs50 import SQL
-from simple_term_menu import TerminalMenu
 import requests
 import logging
 import chardet
@@ -14,7 +14,6 @@ from urllib.error import HTTPError
 from urllib.parse import quote, unquote
 from requests.adapters import HTTPAdapter
 from requests.exceptions import RetryError
-from pyrae import dle
 import regex as re
 import k2a_response_parsers as p
 import k2a_dictionaries as d
@@ -143,6 +142,7 @@ def select_book(db): # select a Kindle book for which a vocab card deck is to be
     :param db:      database handle to kindle sqlite vocab database 
     :return book:   Kindle e-book (db record) selected by user for vocab queries
     """
+    from simple_term_menu import TerminalMenu # only needed by the command line tool
     # get keys of books for which we have looked up vocab
     key_dict = db.execute("SELECT DISTINCT(book_key) FROM LOOKUPS")
     book_keys = [key['book_key'] for key in key_dict]
@@ -191,6 +191,7 @@ def select_card_type(): # select card type 'A' (definitions on the back) or 'B'
    :param :             this function takes no params
    :return card type:   i.e. 'A' or 'B' (see 'options' below)  
    """
+   from simple_term_menu import TerminalMenu # only needed by the command line tool
    options = [
         'A - Front: word and usage example from book / Back: definitions',
         'B - Front: definitions / Back: word and usage example from book'
@@ -234,6 +235,7 @@ def select_dictionary(dicts): # select a dictionary for the lookups
     :param dicts: a list of dictionaries to chose from (those matching the language of the chosen book)
     :return dict: a dictionary (data type) bundling information about the chosen language dictionary
     """
+    from simple_term_menu import TerminalMenu # only needed by the command line tool
     options = [] # for building menu opions
     dict_id = {} # for looking up book_key for selected menu option
 
@@ -266,12 +268,35 @@ def select_dictionary(dicts): # select a dictionary for the lookups
 
     return next((dict for dict in dicts if dict['id'] == dict_id[options[menu_entry_index]]), None)
 
-def get_definitions(http_session, dict, words, log_level, logger): 
+def fetch_pages(http_session, urls, concurrency): # get several urls, at most concurrency of them at a time
+    """
+    :param http_session: the request session object to be used for get requests
+    :param urls:        the urls to be retrieved
+    :param concurrency: number of requests in flight at the same time
+    :return responses:  generator of (index of the url, response or the exception raised) in the
+                        order the responses arrive; a new request is only started once a response
+                        was taken, so at most concurrency responses are held at a time
+    """
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="lookup") as executor:
+        pending = {}
+        next_index = 0
+        while pending or next_index < len(urls):
+            while next_index < len(urls) and len(pending) < concurrency:
+                pending[executor.submit(http_session.get, urls[next_index], timeout=5)] = next_index
+                next_index += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                error = future.exception()
+                yield index, error if error is not None else future.result()
+
+def get_definitions(http_session, dict, words, log_level, logger, concurrency=1): 
     """ retrieve dictionary definitions for the looked-up words from the chosen Kindle book
     :param session:     the request session object to be used for get requests
     :param dict:        a dictionary (data type) containing information about the 
                         (online language) dictionary to be used for lookups
     :param words:       the list of words to be looked up    
+    :param concurrency: number of lookups in flight at the same time
     :return definitions: a dictionary of definitions with looked up words as keys
     """
     definitions = {}        # holds dictionary definitions for word
@@ -287,34 +312,95 @@ def get_definitions(http_session, dict, words, log_level, logger):
     detected_encoding = False
     logging.getLogger('chardet').setLevel(log_level)
 
-    for word in words:
-        # determine lookup url for word
-        if 'linguee' in baseurl:
-            url =  baseurl + word.lower() + '.html'
-        else:
-            url =  baseurl + word.lower()
+    # determine lookup url for each word
+    urls = lookup_urls(baseurl, words)
 
-        logger.info(f"looking up {word} ...")
-        try:
-            r = http_session.get(url, timeout=5)
-        except Exception as err:
-            logger.error(f"an error occured trying to retrieve {url}: {err}")
-            definitions[word] = 'None'
-        else:
-            # detect encoding
-            if not detected_encoding:
-                detected_encoding = chardet.detect(r.content)['encoding']
-            r.encoding = detected_encoding if detected_encoding else 'utf-8'
-            titles[word] = check_redirect(r.url, word)
-            definitions[word] = parse(r.text, word) # word is not used in all parser functions but we submit it for good measure
+    logger.info(f"looking up {len(words)} words ({concurrency} at a time) ...")
+    # each response is parsed (and dropped) as soon as it arrives
+    for index, r in fetch_pages(http_session, urls, concurrency):
+        detected_encoding = read_definition(
+            r, words[index], urls[index], parse, detected_encoding, titles, definitions, logger
+        )
 
-        if definitions[word] == 'None':
-            logger.warning(f'no definition found for {word}')
-        else:
-            logger.info(f'definition found for {word}'  )
+    # in the order of the words, not of the responses
+    definitions = {word: definitions[word] for word in words}
+    return titles, definitions
 
+async def fetch_pages_async(client, urls, concurrency): # fetch_pages in the event loop
+    """
+    :param client:      the httpx.AsyncClient to be used for get requests (see connect_async)
+    :param urls:        the urls to be retrieved
+    :param concurrency: number of requests in flight at the same time
+    :return responses:  async generator of (index of the url, response or the exception raised),
+                        like fetch_pages
+    """
+    pending = {}
+    next_index = 0
+    try:
+        while pending or next_index < len(urls):
+            while next_index < len(urls) and len(pending) < concurrency:
+                pending[asyncio.ensure_future(client.get(urls[next_index]))] = next_index
+                next_index += 1
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = pending.pop(task)
+                error = task.exception()
+                yield index, error if error is not None else task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def get_definitions_async(client, dict, words, log_level, logger, concurrency=1):
+    """ get_definitions awaiting the lookups instead of blocking threads on them
+    :param client:      the httpx.AsyncClient to be used for get requests (see connect_async)
+    :return titles, definitions: like get_definitions
+    """
+    definitions = {}
+    titles = {}
+    baseurl = dict['url']
+    parse = getattr(p, 'parse_' + dict['src_lang'] + "_" + str(dict['id']))
+    detected_encoding = False
+    logging.getLogger('chardet').setLevel(log_level)
+    urls = lookup_urls(baseurl, words)
+
+    logger.info(f"looking up {len(words)} words at {baseurl} ({concurrency} at a time) ...")
+    async for index, r in fetch_pages_async(client, urls, concurrency):
+        detected_encoding = read_definition(
+            r, words[index], urls[index], parse, detected_encoding, titles, definitions, logger
+        )
+
+    definitions = {word: definitions[word] for word in words}
     return titles, definitions
 
+def lookup_urls(baseurl, words): # lookup url of each word
+    if 'linguee' in baseurl:
+        return [baseurl + word.lower() + '.html' for word in words]
+    return [baseurl + word.lower() for word in words]
+
+def read_definition(r, word, url, parse, encoding, titles, definitions, logger): # parse one lookup response
+    """
+    :param r:           the response (requests or httpx) or the exception raised by the lookup
+    :param encoding:    page encoding detected so far (False before the first page)
+    :param titles, definitions: dictionaries the word's title and definition are added to
+    :return encoding:   the page encoding, detected on the first page and kept for the others
+    """
+    if isinstance(r, Exception):
+        logger.error(f"an error occured trying to retrieve {url}: {r}")
+        definitions[word] = 'None'
+    else:
+        # detect encoding
+        if not encoding:
+            encoding = chardet.detect(r.content)['encoding']
+        r.encoding = encoding if encoding else 'utf-8'
+        titles[word] = check_redirect(str(r.url), word)
+        definitions[word] = parse(r.text, word) # word is not used in all parser functions but we submit it for good measure
+
+    if definitions[word] == 'None':
+        logger.warning(f'no definition found for {word}')
+    else:
+        logger.info(f'definition found for {word}'  )
+    return encoding
+
 def check_redirect(url, word):
     if "larousse" in url.lower():
         return unquote(url.split("/")[-2])
@@ -328,6 +414,7 @@ def get_definitions_rae(words, log_level, logger): # custom get_definitions func
     :param words:       the list of words to be looked up    
     :return definitions: a dictionary of definitions with looked up words as keys
     """
+    from pyrae import dle # imported on first use, it is only needed for the RAE dictionary
     dle.set_log_level(log_level)
     definitions = {}
     titles = {}
@@ -440,14 +527,7 @@ def connect(url, referer, log_level): # initiate https connection to online dict
     adapter = HTTPAdapter(max_retries=5)
     session = requests.Session()
     session.mount(url, adapter)
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Referer': referer,
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Connection': 'keep-alive'
-    }
+    headers = browser_headers(referer)
 
     try:
         r = session.get(
@@ -468,6 +548,42 @@ def connect(url, referer, log_level): # initiate https connection to online dict
 
     return session
 
+async def connect_async(url, referer, log_level): # connect for async lookups (see get_definitions_async)
+    """
+    :param url:         dicionary URL 
+    :log_level:         log level for client logging
+    :return client:     httpx.AsyncClient, to be closed by the caller (aclose)
+    """
+    import httpx # imported on first use, it is only needed when serving with asgi.py
+    logging.getLogger("httpx").setLevel(log_level)
+    headers = browser_headers(referer)
+    del headers['Accept-Encoding']  # httpx announces the encodings it can decode
+    client = httpx.AsyncClient(
+        headers = headers,
+        timeout = httpx.Timeout(5, connect=3),
+        follow_redirects = True,
+        transport = httpx.AsyncHTTPTransport(retries=5)
+    )
+    try:
+        r = await client.get(url)
+        r.raise_for_status()
+    except Exception as err:
+        print(f"some error occured: {err}")
+    else:
+        print(f"Successfully connected to {url}")
+
+    return client
+
+def browser_headers(referer): # request headers of a browser coming from referer
+    return {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Referer': referer,
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Connection': 'keep-alive'
+    }
+
 def create_deck(deckname, logger): # create a card deck
     deckname = str(deckname)
     """
@@ -531,7 +647,6 @@ def create_cards(deck, dict, card_type, words, usage, titles, definitions, logge
         else:
             cards += 1        
             logger.info(f"Adding card for {word} ...")
-            flash(f"Adding card for {word} ...", "info")
             #htmlify '\n' in definitions and highlight word occurences in bold-face
             title = titles[word]
             definition = highlight(definitions[word].replace('\n','<br>'), word, card_type, dict['src_lang'])
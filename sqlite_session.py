@@ -0,0 +1,157 @@
+# sqlite_session.py - server-side sessions in a SQLite (WAL) database
+
+# imports
+import logging
+import secrets
+import sqlite3
+import threading
+import time
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger(__name__)
+
+# sessions are written at most this big (bytes of JSON), old flash messages are dropped first
+SESSION_MAX_SIZE = 16 * 1024
+# expired sessions are deleted at most this often (seconds, per process)
+SESSION_SWEEP_INTERVAL = 10 * 60
+# the expiry of unchanged sessions is only pushed back if it is older than this (seconds)
+SESSION_REFRESH_INTERVAL = 60 * 60
+
+SESSION_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+    sid          TEXT PRIMARY KEY NOT NULL,
+    data         TEXT NOT NULL,
+    expires      REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires);
+"""
+
+class SqliteSession(CallbackDict, SessionMixin):
+    """ session dict that remembers whether it was changed or cleared (e.g. on login),
+    a cleared session gets a new sid when it is saved"""
+
+    def __init__(self, initial=None, sid=None, new=False, expires=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires = expires
+        self.modified = False
+        self.rotate = False
+
+    def clear(self):
+        super().clear()
+        self.rotate = True
+
+class SqliteSessionInterface(SessionInterface):
+    """
+    Keeps session data (JSON, like Flask's cookie sessions) in a SQLite table keyed by a random sid
+    that is the only thing stored in the cookie. A session is only written when it changed,
+    expired sessions are swept periodically and oversized sessions are trimmed before saving.
+    """
+
+    def __init__(self, db_path, max_size=SESSION_MAX_SIZE, sweep_interval=SESSION_SWEEP_INTERVAL):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.sweep_interval = sweep_interval
+        self.last_sweep = 0
+        self._local = threading.local()
+        self._connect().executescript(SESSION_SCHEMA)
+
+    def _connect(self):
+        # one connection per thread, reused across requests
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _lifetime(self, app):
+        return app.permanent_session_lifetime.total_seconds()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            row = self._connect().execute(
+                "SELECT data, expires FROM sessions WHERE sid = ? AND expires > ?", (sid, time.time())
+            ).fetchone()
+            if row is not None:
+                try:
+                    return SqliteSession(session_json_serializer.loads(row[0]), sid=sid, expires=row[1])
+                except Exception as e:
+                    logger.warning(f"SqliteSessionInterface: dropping unreadable session: {e}")
+        return SqliteSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def _serialize(self, session):
+        data = session_json_serializer.dumps(dict(session))
+        if len(data) <= self.max_size:
+            return data
+        # drop the oldest flash messages until the session fits (newest ones are kept)
+        flashes = list(session.get("_flashes", []))
+        while flashes and len(data) > self.max_size:
+            del flashes[:max(1, len(flashes) // 2)]
+            data = session_json_serializer.dumps({**session, "_flashes": flashes})
+        if len(data) > self.max_size:
+            logger.warning(f"SqliteSessionInterface: session of {len(data)} bytes exceeds {self.max_size} bytes")
+        return data
+
+    def _sweep(self, conn, now):
+        if now - self.last_sweep < self.sweep_interval:
+            return
+        self.last_sweep = now
+        deleted = conn.execute("DELETE FROM sessions WHERE expires <= ?", (now,)).rowcount
+        if deleted:
+            logger.info(f"SqliteSessionInterface: swept {deleted} expired session(s)")
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        conn = self._connect()
+        now = time.time()
+        self._sweep(conn, now)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        had_cookie = not session.new
+        if session.rotate and had_cookie:
+            # cleared sessions (login, logout) continue under a new sid
+            conn.execute("DELETE FROM sessions WHERE sid = ?", (session.sid,))
+            session.sid = secrets.token_urlsafe(32)
+            session.new = True
+
+        if not session:
+            # empty sessions are not stored
+            if had_cookie:
+                conn.execute("DELETE FROM sessions WHERE sid = ?", (session.sid,))
+                if session.modified:
+                    response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        expires = now + self._lifetime(app)
+        if session.modified or session.new:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)",
+                (session.sid, self._serialize(session), expires)
+            )
+        elif session.expires is not None and expires - session.expires > SESSION_REFRESH_INTERVAL:
+            conn.execute("UPDATE sessions SET expires = ? WHERE sid = ?", (expires, session.sid))
+        else:
+            return
+
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
@@ -0,0 +1,91 @@
+# static_assets.py - precompressed (brotli / gzip) copies of static text assets and serving them
+
+# imports
+import gzip
+import mimetypes
+import os
+import posixpath
+from pathlib import Path
+from flask import abort, current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, only .gz copies are built then
+    brotli = None
+
+# static files worth compressing (images and fonts are compressed already)
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".json", ".webmanifest", ".svg", ".txt", ".html", ".xml", ".ico"}
+# tiny files are not worth the extra request header and file
+COMPRESS_MIN_SIZE = 256
+# folders under static that hold per-user files, these are only served by their own routes
+PRIVATE_STATIC_DIRS = {"userdata"}
+# encodings in order of preference, with the suffix of their precompressed copy
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+def _compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    # mtime=0 keeps the output (and its ETag) stable across builds
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def compress_static_assets(static_folder, logger):
+    """ write .br / .gz copies next to every compressible static file whose copy is missing
+    or older than the file (copies that would not be smaller are removed)
+    :return: number of copies written"""
+    written = 0
+    for path in sorted(Path(static_folder).rglob("*")):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE_SUFFIXES:
+            continue
+        stat = path.stat()
+        if stat.st_size < COMPRESS_MIN_SIZE:
+            continue
+        data = None
+        for encoding, suffix in ENCODINGS:
+            if encoding == "br" and brotli is None:
+                continue
+            target = path.with_name(path.name + suffix)
+            if target.exists() and target.stat().st_mtime >= stat.st_mtime:
+                continue
+            if data is None:
+                data = path.read_bytes()
+            compressed = _compress(data, encoding)
+            if len(compressed) >= len(data):
+                target.unlink(missing_ok=True)
+                continue
+            tmp_path = target.with_name(f".{target.name}.tmp")
+            tmp_path.write_bytes(compressed)
+            os.replace(tmp_path, target)
+            written += 1
+            logger.info(f"compress_static_assets: {target} ({len(data)} -> {len(compressed)} bytes)")
+    if brotli is None:
+        logger.info("compress_static_assets: brotli not installed, built gzip copies only")
+    return written
+
+def send_static_asset(filename):
+    """ static view serving the precompressed copy of a file if the client accepts its
+    encoding and the copy is up to date, the file itself otherwise
+    (user data, e.g. decks and vocab.db files, is not served here)"""
+    if posixpath.normpath(filename).lstrip("/").split("/")[0].lower() in PRIVATE_STATIC_DIRS:
+        abort(404)
+    static_folder = current_app.static_folder
+    max_age = current_app.get_send_file_max_age(filename)
+    path = Path(static_folder) / filename
+    if path.suffix in COMPRESSIBLE_SUFFIXES:
+        for encoding, suffix in ENCODINGS:
+            if not request.accept_encodings[encoding]:
+                continue
+            compressed = path.with_name(path.name + suffix)
+            try:
+                if compressed.stat().st_mtime < path.stat().st_mtime:
+                    continue
+            except OSError:
+                continue
+            mimetype = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            response = send_from_directory(static_folder, filename + suffix, mimetype=mimetype, max_age=max_age)
+            response.content_encoding = encoding
+            response.vary.add("Accept-Encoding")
+            return response
+    response = send_from_directory(static_folder, filename, max_age=max_age)
+    if path.suffix in COMPRESSIBLE_SUFFIXES:
+        response.vary.add("Accept-Encoding")
+    return response